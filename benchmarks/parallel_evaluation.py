@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# coding: UTF-8
+"""
+Scaling of the thread-parallel evaluation with the number of workers.
+
+    python benchmarks/parallel_evaluation.py [points] [max_workers]
+"""
+from __future__ import division
+
+import os
+import sys
+import timeit
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.path.pardir))
+
+import numpy as np
+from pychebfun import *
+
+M = int(sys.argv[1]) if len(sys.argv) > 1 else 10**6
+max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+x = np.random.uniform(-1, 1, M)
+for N in [16, 256, 2048]:
+    p = Chebfun.from_chebcoeff(np.random.randn(N)/np.arange(1, N+1)**2, prune=False)
+    for algorithm in Chebfun.algorithms:
+        serial = p(x, algorithm=algorithm, workers=1)
+        reference = None
+        workers = 1
+        while workers <= max_workers:
+            values = p(x, algorithm=algorithm, workers=workers)
+            assert np.array_equal(values, serial)
+            elapsed = min(timeit.repeat(lambda: p(x, algorithm=algorithm, workers=workers), number=1, repeat=3))
+            if reference is None:
+                reference = elapsed
+            print("N={0:5d} {1:12s} workers={2:2d} {3:8.4f}s speedup {4:5.2f}".format(N, algorithm, workers, elapsed, reference/elapsed))
+            workers *= 2
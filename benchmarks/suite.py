@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+# coding: UTF-8
+"""
+Benchmark suite
+===============
+
+Times the public operations of pychebfun over a sweep of degrees, numbers of evaluation points and numbers of columns,
+records the peak memory of each case, and compares the results with a baseline.
+
+    python benchmarks/suite.py run results.json [--max-degree 1024] [--filter evaluate]
+    python benchmarks/suite.py compare results.json baseline.json [--threshold 0.25]
+
+A baseline is simply the result of `run` on a reference version.
+`compare` exits with status 1 if a case is slower, or uses more memory, than the baseline by more than the threshold.
+
+Each case runs in a forked process, so that its peak memory (VmHWM, Linux) is measured separately.
+"""
+from __future__ import division, print_function
+
+import os
+import sys
+import json
+import time
+import timeit
+import platform
+import argparse
+import resource
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.path.pardir))
+
+import numpy as np
+import scipy
+
+import pychebfun
+from pychebfun import *
+
+degrees = [2**k for k in range(3, 16)]
+points = [10, 1000, 100000]
+columns = [1, 8]
+
+# largest degree for the operations which resample adaptively, or whose cost grows faster than N log N
+max_resampling_degree = 1024
+max_roots_degree = 8192
+
+# ----------------------------------------------------------------
+# Cases
+# ----------------------------------------------------------------
+
+def chebfun_of_degree(N, m=1):
+    """
+    A chebfun of N coefficients (with m columns), decaying slowly.
+    """
+    rng = np.random.RandomState(N)
+    coeffs = rng.randn(N, m)/np.arange(1, N+1)[:, np.newaxis]**2
+    if m == 1:
+        coeffs = coeffs[:, 0]
+    return Chebfun.from_chebcoeff(coeffs, prune=False)
+
+def cases(max_degree):
+    """
+    Generate (name, parameters, setup) where setup() returns the function to time.
+    """
+    for N in [N for N in degrees if N <= max_degree]:
+        def construct(N=N):
+            return lambda: Chebfun.from_function(np.cos, N=N)
+        yield 'from_function', {'degree': N}, construct
+
+        def dichotomy(N=N):
+            omega = N/2
+            return lambda: Chebfun.dichotomy(lambda x: np.cos(omega*x), kmax=17)
+        yield 'dichotomy', {'degree': N}, dichotomy
+
+        for m in columns:
+            def fit(N=N, m=m):
+                data = np.random.randn(N, m)
+                return lambda: chebpolyfit(data)
+            yield 'chebpolyfit', {'degree': N, 'columns': m}, fit
+
+            def val(N=N, m=m):
+                data = np.random.randn(N, m)
+                return lambda: chebpolyval(data)
+            yield 'chebpolyval', {'degree': N, 'columns': m}, val
+
+        for M in points:
+            for algorithm in Chebfun.algorithms:
+                def evaluate(N=N, M=M, algorithm=algorithm):
+                    c = chebfun_of_degree(N)
+                    x = np.linspace(-1, 1, M)
+                    return lambda: c(x, algorithm=algorithm)
+                yield 'evaluate', {'degree': N, 'points': M, 'algorithm': algorithm}, evaluate
+
+            for m in columns[1:]:
+                def evaluate_columns(N=N, M=M, m=m):
+                    c = chebfun_of_degree(N, m)
+                    x = np.linspace(-1, 1, M)
+                    return lambda: c(x)
+                yield 'evaluate', {'degree': N, 'points': M, 'columns': m}, evaluate_columns
+
+        def add(N=N):
+            c = chebfun_of_degree(N)
+            d = chebfun_of_degree(N//2 + 1)
+            return lambda: c + d
+        yield 'add', {'degree': N}, add
+
+        def mul(N=N):
+            c = chebfun_of_degree(N)
+            return lambda: c * c
+        yield 'mul', {'degree': N}, mul
+
+        def unary(name, N=N):
+            def setup():
+                c = chebfun_of_degree(N)
+                method = getattr(c, name)
+                return method
+            return setup
+        for name in ['sum', 'integrate']:
+            yield name, {'degree': N}, unary(name)
+
+        # the following methods cache their result, so they are called on a new chebfun each time
+        def fresh(name, N=N):
+            def setup():
+                coeffs = chebfun_of_degree(N).chebyshev_coefficients()
+                return lambda: getattr(Chebfun.from_chebcoeff(coeffs, prune=False), name)()
+            return setup
+        for name in ['differentiate', 'values']:
+            yield name, {'degree': N}, fresh(name)
+
+        def coefficients(N=N):
+            values = chebfun_of_degree(N).values()
+            return lambda: Chebfun(values, scale=1.).chebyshev_coefficients()
+        yield 'chebyshev_coefficients', {'degree': N}, coefficients
+
+        def dot(N=N):
+            c = chebfun_of_degree(N)
+            return lambda: c.dot(c)
+        yield 'dot', {'degree': N}, dot
+
+        for m in columns[1:]:
+            def gram_matrix(N=N, m=m):
+                a = ChebfunArray.from_chebcoeff(np.random.randn(N, m), prune=False)
+                return a.gram
+            yield 'gram', {'degree': N, 'columns': m}, gram_matrix
+
+        if N <= max_resampling_degree:
+            def ufunc(N=N):
+                x = Chebfun.identity()
+                c = np.cos(N/4*x)
+                return lambda: np.sin(c)
+            yield 'sin', {'degree': N}, ufunc
+
+            def div(N=N):
+                c = chebfun_of_degree(N)
+                d = 2 + Chebfun.identity()
+                return lambda: c / d
+            yield 'div', {'degree': N}, div
+
+            def lazy(N=N):
+                x = Chebfun.identity()
+                e = (x.lazy()*(N/4)).cos().exp()
+                return e.chebfun
+            yield 'lazy', {'degree': N}, lazy
+
+            for m in columns[1:]:
+                def array(N=N, m=m):
+                    k = np.linspace(.5, 1., m)*N/2
+                    return lambda: ChebfunArray.from_function(lambda x: np.cos(np.outer(x, k)))
+                yield 'ChebfunArray.from_function', {'degree': N, 'columns': m}, array
+
+        if N <= max_roots_degree:
+            def roots(N=N):
+                c = Chebfun.from_function(lambda x: np.cos(N/2*x), N=N)
+                return c.roots
+            yield 'roots', {'degree': N}, roots
+
+            for name in ['min', 'max', 'extrema']:
+                yield name, {'degree': N}, fresh(name)
+
+    for kinks in [1, 4, 16]:
+        def piecewise(kinks=kinks):
+            return lambda: PiecewiseChebfun.from_function(lambda x: np.abs(np.sin(kinks*np.pi*(x + 1)/2)))
+        yield 'PiecewiseChebfun.from_function', {'kinks': kinks}, piecewise
+
+# ----------------------------------------------------------------
+# Measurements
+# ----------------------------------------------------------------
+
+def memory_status(field):
+    """
+    Field of /proc/self/status in bytes (Linux): VmRSS is the resident memory, VmHWM its peak.
+    """
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])*1024
+
+def reset_peak_memory():
+    """
+    Reset the peak resident memory to the current one (Linux 4.0 and later), which a forked process otherwise inherits.
+    Return whether it was possible.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except IOError:
+        return False
+    return True
+
+def peak_memory():
+    """
+    Peak resident memory of the process in bytes.
+    """
+    try:
+        return memory_status('VmHWM')
+    except IOError:
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024
+
+def time_function(fun, minimum=.2, repeat=5):
+    """
+    Best time of one call, the number of calls per measurement being increased until it lasts at least `minimum` seconds.
+    """
+    number = 1
+    while True:
+        elapsed = timeit.timeit(fun, number=number)
+        if elapsed >= minimum or number >= 10**6:
+            break
+        number *= 10
+    times = [elapsed] + timeit.repeat(fun, number=number, repeat=repeat-1)
+    return min(times)/number
+
+def measure(setup):
+    """
+    Time of one call and peak memory of the function returned by setup, measured in a forked process.
+    """
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        try:
+            fun = setup()
+            reset_peak_memory()
+            before = peak_memory()
+            fun()
+            memory = max(peak_memory() - before, 0)
+            result = {'time': time_function(fun), 'peak_memory': memory}
+        except Exception as error:
+            result = {'error': repr(error)}
+        with os.fdopen(write, 'w') as output:
+            output.write(json.dumps(result))
+        os._exit(0)
+    os.close(write)
+    with os.fdopen(read) as output:
+        data = output.read()
+    os.waitpid(pid, 0)
+    return json.loads(data)
+
+def key(name, params):
+    return name + ' ' + ' '.join('{0}={1}'.format(k, params[k]) for k in sorted(params))
+
+def run(output, max_degree, pattern=None):
+    results = []
+    for name, params, setup in cases(max_degree):
+        if pattern is not None and pattern not in name:
+            continue
+        result = measure(setup)
+        result.update(name=name, params=params)
+        results.append(result)
+        if 'error' in result:
+            print("{0:60s} {1}".format(key(name, params), result['error']))
+        else:
+            print("{0:60s} {1:10.3e}s {2:10d}B".format(key(name, params), result['time'], result['peak_memory']))
+        sys.stdout.flush()
+    metadata = {
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'pychebfun': pychebfun.__version__,
+        'platform': platform.platform(),
+        'max_degree': max_degree,
+        }
+    with open(output, 'w') as f:
+        json.dump({'metadata': metadata, 'results': results}, f, indent=1, sort_keys=True)
+
+# ----------------------------------------------------------------
+# Comparison
+# ----------------------------------------------------------------
+
+# memory differences below this number of bytes are ignored
+memory_floor = 2**20
+
+def compare(results, baseline, threshold):
+    """
+    Print the ratios of the results to the baseline, and return the list of regressions.
+    """
+    def index(data):
+        return dict((key(r['name'], r['params']), r) for r in data['results'] if 'error' not in r)
+    new = index(results)
+    old = index(baseline)
+    regressions = []
+    for k in sorted(set(new) & set(old)):
+        time_ratio = new[k]['time']/old[k]['time']
+        flags = []
+        if time_ratio > 1 + threshold:
+            flags.append('time')
+        new_memory, old_memory = new[k]['peak_memory'], old[k]['peak_memory']
+        if new_memory > memory_floor and new_memory > (1 + threshold)*max(old_memory, memory_floor):
+            flags.append('memory')
+        if flags:
+            regressions.append((k, flags))
+        print("{0:60s} time {1:6.2f}x  memory {2:10d}B -> {3:10d}B {4}".format(k, time_ratio, old_memory, new_memory, ' '.join(flags).upper()))
+    for k in sorted(set(old) - set(new)):
+        print("{0:60s} missing".format(k))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="pychebfun benchmark suite")
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser('run', help="run the benchmarks and write the results as JSON")
+    run_parser.add_argument('output')
+    run_parser.add_argument('--max-degree', type=int, default=degrees[-1])
+    run_parser.add_argument('--filter', help="only the operations whose name contains this string")
+    compare_parser = subparsers.add_parser('compare', help="compare results with a baseline")
+    compare_parser.add_argument('results')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('--threshold', type=float, default=.25, help="relative slowdown deemed a regression")
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        run(args.output, args.max_degree, args.filter)
+        return 0
+    with open(args.results) as f:
+        results = json.load(f)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print("{0} regressions".format(len(regressions)))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
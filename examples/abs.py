@@ -31,3 +31,6 @@ for f in abses:
 
 c,f = zip(cs,abses)[3]
 c.compare(f)
+
+# the piecewise chebfun of abs has a breakpoint at zero and only a few points
+p = PiecewiseChebfun.from_function(np.abs)
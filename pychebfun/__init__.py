@@ -12,6 +12,10 @@ __version__ = "0.2"
 
 from plotting import *
 from chebfun import *
+from batch import *
+from piecewise import *
+from library import *
+from instrumentation import instrumentation, Counters, add_recorder, remove_recorder
 
 
 
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# coding: UTF-8
+"""
+Batches of chebfuns
+===================
+
+Many scalar chebfuns constructed together on a shared grid,
+with their Chebyshev coefficients stored in one matrix.
+"""
+from __future__ import division
+
+import numpy as np
+
+from .chebfun import Chebfun, coefficient_scale, plateau_cutoffs, plateau_resolved, sample_function, chebpolyfit, chebpolyval, interpolation_points, interpolator, chebdiff, quadrature_weights, product_weights_dot, default_domain, from_domain, compose_domain
+
+class ChebfunArray(object):
+    """
+    Array of m scalar chebfuns.
+    The coefficients are stored in an (N, m) matrix, column i being zero beyond sizes[i].
+    """
+
+    NoConvergence = Chebfun.NoConvergence
+
+    @classmethod
+    def from_function(self, f, N=None, domain=None, chop=None, tol=None):
+        """
+        Initialise from a function returning an array of shape (len(x), m).
+        N: optional parameter which indicates the range of the dichotomy
+        domain: the interval [a, b] on which f is sampled; [-1, 1] if not given
+        chop: chopping rule, 'threshold' or 'plateau'; `Chebfun.chop` if not given
+        tol: relative tolerance of the approximation; close to machine precision if not given
+        """
+        if chop is None:
+            chop = Chebfun.chop
+        args = Chebfun._dichotomy_arguments(N)
+        args.update(f=f, domain=domain, chop=chop, tol=tol)
+
+        coeffs = self.dichotomy(**args)
+        return self.from_chebcoeff(coeffs, scale=coefficient_scale(coeffs, axis=0), domain=domain, chop=chop, tol=tol)
+
+    @classmethod
+    def from_functions(self, fs, N=None, domain=None, chop=None, tol=None):
+        """
+        Initialise from a list of m scalar functions, sampled together.
+        """
+        def f(x):
+            return np.column_stack([g(x) for g in fs])
+        return self.from_function(f, N, domain, chop, tol)
+
+    @classmethod
+    def from_chebfuns(self, chebfuns):
+        """
+        Initialise from a list of scalar chebfuns, defined on the same domain.
+        """
+        domain = chebfuns[0].domain()
+        for c in chebfuns:
+            chebfuns[0]._check_domain(c)
+        coeffs = [c.chebyshev_coefficients() for c in chebfuns]
+        N = max(len(c) for c in coeffs)
+        matrix = np.zeros((N, len(coeffs)), dtype=np.result_type(*coeffs))
+        for i, c in enumerate(coeffs):
+            matrix[:len(c), i] = c
+        return self(matrix, [len(c) for c in coeffs], domain)
+
+    @classmethod
+    def dichotomy(self, f, kmin=2, kmax=12, raise_no_convergence=True, domain=None, chop=None, tol=None):
+        """
+        Compute the coefficients of all the components of f by dichotomy.
+        The dichotomy stops when every column is resolved, according to the chopping rule of `Chebfun`.
+        """
+        if domain is not None:
+            f = compose_domain(f, domain)
+        def columns(x):
+            return np.asarray(f(x)).reshape(len(x), -1)
+
+        sampled = None
+        for k in xrange(kmin, kmax):
+            N = pow(2, k)
+
+            sampled = sample_function(columns, N, sampled)
+            coeffs = chebpolyfit(sampled)
+
+            if self._converged(coeffs, chop, tol):
+                break
+        else:
+            if raise_no_convergence:
+                raise self.NoConvergence(abs(coeffs[-2:]), Chebfun._threshold(np.max(np.abs(coeffs), axis=0), tol))
+        return coeffs
+
+    @classmethod
+    def _converged(self, coeffs, chop=None, tol=None):
+        """
+        Whether every column is resolved, according to the chopping rule of `Chebfun`, tested on all the columns at once.
+        """
+        if Chebfun._use_plateau(coeffs, chop):
+            return np.all(plateau_resolved(np.abs(coeffs), Chebfun._plateau_tol(tol)))
+        scale = np.max(np.abs(coeffs), axis=0)
+        return np.all(abs(coeffs[-2:]) <= Chebfun._threshold(scale, tol))
+
+    @classmethod
+    def from_chebcoeff(self, chebcoeff, prune=True, scale=None, domain=None, chop='threshold', tol=None):
+        """
+        Initialise from an (N, m) matrix of Chebyshev coefficients.
+        prune: Whether to prune the negligible coefficients of each column
+        scale: the scale to use when pruning, for all the columns or for each one;
+        1 if not given, `coefficient_scale(chebcoeff, axis=0)` to prune each column relative to its largest coefficient
+        domain: the interval [a, b]; [-1, 1] if not given
+        chop: rule to prune the coefficients, 'threshold' or 'plateau'
+        tol: tolerance of the pruning, relative to scale; close to machine precision if not given
+        """
+        coeffs = np.asarray(chebcoeff)
+        N = len(coeffs)
+        if scale is None:
+            scale = 1.
+        if prune:
+            sizes = self._cutoff(coeffs, scale, chop, tol)
+        else:
+            sizes = np.repeat(N, coeffs.shape[1])
+        return self(coeffs, sizes, domain)
+
+    @classmethod
+    def _cutoff(self, coeffs, scale, chop='threshold', tol=None):
+        """
+        Cutoff index of each column after which the coefficients are deemed negligible:
+        up to the plateau for the 'plateau' rule, where there is one, otherwise up to the last coefficient above the threshold.
+        """
+        significant = abs(coeffs) >= Chebfun._threshold(scale, tol)
+        last = len(coeffs) - 1 - np.argmax(significant[::-1], axis=0)
+        last[~np.any(significant, axis=0)] = 0
+        sizes = last + 1
+        if Chebfun._use_plateau(coeffs, chop):
+            plateau = plateau_cutoffs(np.abs(coeffs), Chebfun._plateau_tol(tol))
+            sizes = np.where(plateau > 0, plateau, sizes)
+        return sizes
+
+    def __init__(self, chebcoeff, sizes, domain=None):
+        """
+        chebcoeff: (N, m) matrix of Chebyshev coefficients
+        sizes: number of coefficients of each column
+        domain: the interval [a, b]; [-1, 1] if not given
+        """
+        if domain is None:
+            self._domain = default_domain
+        else:
+            self._domain = np.array(domain, dtype=float)
+        self._sizes = np.asarray(sizes, dtype=int)
+        N = np.max(self._sizes)
+        coeffs = np.array(np.asarray(chebcoeff)[:N])
+        coeffs[np.arange(N)[:, np.newaxis] >= self._sizes] = 0
+        self._coeffs = coeffs
+        self._p = None
+
+    def __repr__(self):
+        return "<ChebfunArray({0})>".format(len(self))
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def __getitem__(self, i):
+        """
+        The i-th chebfun.
+        """
+        return Chebfun.from_chebcoeff(self._coeffs[:self._sizes[i], i], prune=False, domain=self._domain)
+
+    def domain(self):
+        return self._domain
+
+    def sizes(self):
+        """
+        Number of coefficients of each chebfun.
+        """
+        return self._sizes
+
+    def chebyshev_coefficients(self):
+        """
+        The (N, m) coefficient matrix.
+        """
+        return self._coeffs
+
+    def values(self):
+        """
+        The values of all the chebfuns on the shared grid of Chebyshev points.
+        """
+        return chebpolyval(self._coeffs)
+
+    def __call__(self, x):
+        """
+        Evaluate all the chebfuns at x; the last axis of the result is the chebfun index.
+        """
+        if self._p is None:
+            self._p = interpolator(interpolation_points(len(self._coeffs)), self.values())
+        return self._p(from_domain(x, self._domain))
+
+    def sum(self):
+        """
+        Integrals of all the chebfuns over the domain.
+        """
+        a, b = self._domain
+        return np.dot(quadrature_weights(len(self._coeffs)), self._coeffs)*(b-a)/2
+
+    def gram(self):
+        """
+        Matrix of the scalar products of all the pairs of chebfuns, computed from the coefficient matrix in one pass.
+        """
+        a, b = self._domain
+        return np.dot(self._coeffs.T, product_weights_dot(self._coeffs))*(b-a)/2
+
+    def differentiate(self, n=1):
+        """
+        n-th derivatives of all the chebfuns.
+        """
+        a, b = self._domain
+        bi = chebdiff(self._coeffs, n)*(2/(b-a))**n
+        return ChebfunArray(bi, np.maximum(self._sizes - n, 1), self._domain)
+
+def gram(chebfuns):
+    """
+    Gram matrix of a list of scalar chebfuns on the same domain, or of a ChebfunArray.
+    """
+    if not isinstance(chebfuns, ChebfunArray):
+        chebfuns = ChebfunArray.from_chebfuns(chebfuns)
+    return chebfuns.gram()
@@ -18,10 +18,18 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 import sys
+import os
+import tempfile
+import mmap
+import threading
 from functools import wraps
+from collections import OrderedDict, namedtuple
 
 from scipy.interpolate import BarycentricInterpolator as Bary
 import numpy.polynomial as poly
+import scipy.sparse as sparse
+
+from .instrumentation import recorders, record, instrumented, timer
 
 def cast_scalar(method):
     """
@@ -30,24 +38,35 @@ def cast_scalar(method):
     @wraps(method)
     def new_method(self, other):
         if np.isscalar(other):
-            other = Chebfun([other])
+            other = Chebfun([other], domain=self.domain())
+        elif isinstance(other, LazyChebfun):
+            # let the lazy expression record the operation
+            return NotImplemented
+        elif isinstance(self, Chebfun) and isinstance(other, tuple(operand_types)):
+            # let the other operand combine with the Chebfun, through its reflected operator
+            return NotImplemented
         return method(self, other)
     return new_method
 
+# types of operands which combine with chebfuns themselves, such as piecewise chebfuns
+operand_types = []
+
 emach     = sys.float_info.epsilon                        # machine epsilon
 
-def chebfun(f=None, N=None, chebcoeff=None,):
+def chebfun(f=None, N=None, chebcoeff=None, domain=None, tol=None):
     """
 Create a Chebyshev polynomial approximation of the function $f$ on the interval :math:`[-1, 1]`.
 
 :param callable f: Python, Numpy, or Sage function
 :param int N: (default = None)  specify number of interpolating points
 :param np.array chebcoeff: (default = np.array(0)) specify the coefficients of a Chebfun
+:param domain: (default = None) the interval [a, b]; [-1, 1] if not given
+:param float tol: (default = None) relative tolerance of the approximation; close to machine precision if not given
     """
 
     # Chebyshev coefficients
     if chebcoeff is not None:
-        return Chebfun.from_chebcoeff(chebcoeff)
+        return Chebfun.from_chebcoeff(chebcoeff, domain=domain, tol=tol)
 
     # another Chebfun instance
     if isinstance(f, Chebfun):
@@ -55,7 +74,7 @@ Create a Chebyshev polynomial approximation of the function $f$ on the interval
 
     # callable
     if hasattr(f, '__call__'):
-        return Chebfun.from_function(f, N)
+        return Chebfun.from_function(f, N, domain=domain, tol=tol)
 
     # from here on, assume that f is None, or iterable
     if np.isscalar(f):
@@ -66,18 +85,24 @@ Create a Chebyshev polynomial approximation of the function $f$ on the interval
     except TypeError:
         pass
     else:
-        return Chebfun(f)
+        return Chebfun(f, domain=domain)
 
     raise TypeError('Impossible to initialise the Chebfun object from an object of type {}'.format(type(f)))
 
 
-
+class SamplingError(Exception):
+    """
+    Raised when a function cannot be sampled; the arguments are the points concerned and the original error.
+    """
 
 class Chebfun(object):
     """
     Construct a Lagrange interpolating polynomial over the Chebyshev points.
 
     """
+    # the __dict__ is only allocated when a setting such as `grain` or `workers` is overridden on an instance
+    __slots__ = ('_value_array', '_coeffs', '_dcoeffs', '_scale', '_domain', '_samples', '_p', '_shared', '__dict__', '__weakref__')
+
     # ----------------------------------------------------------------
     # Initialisation methods
     # ----------------------------------------------------------------
@@ -87,69 +112,161 @@ class Chebfun(object):
         Raised when dichotomy does not converge.
         """
 
+    class DomainMismatch(ValueError):
+        """
+        Raised when combining chebfuns defined on different domains.
+        """
+
+    SamplingError = SamplingError
+
     @classmethod
-    def from_data(self, data):
+    def from_data(self, data, domain=None):
         """
         Initialise from interpolation values.
         """
-        return self(data)
+        return self(data, domain=domain)
 
     @classmethod
     def from_chebfun(self, other):
         """
         Initialise from another instance of Chebfun
         """
-        return self(other.values())
+        if other._value_array is None:
+            # the read-only coefficients are shared
+            return self._from_coefficients(other.chebyshev_coefficients(), other._scale, other.domain())
+        return self(other.values(), domain=other.domain())
 
     @classmethod
-    def from_chebcoeff(self, chebcoeff, prune=True, scale=1.):
+    def from_chebcoeff(self, chebcoeff, prune=True, scale=None, domain=None, chop='threshold', tol=None):
         """
         Initialise from provided Chebyshev coefficients
         prune: Whether to prune the negligible coefficients
-        scale: the scale to use when pruning
+        scale: the scale to use when pruning; 1 if not given, `coefficient_scale(chebcoeff)` to prune relative to the largest coefficient
+        domain: the interval [a, b]; [-1, 1] if not given
+        chop: rule to prune the coefficients, 'threshold' or 'plateau' (see `_chop`)
+        tol: tolerance of the pruning, relative to scale; close to machine precision if not given
         """
         coeffs = np.asarray(chebcoeff)
+        if scale is None:
+            scale = 1.
         if prune:
-            N = self._cutoff(coeffs, scale)
+            N = self._chop(coeffs, scale, chop, tol)
             pruned_coeffs = coeffs[:N]
         else:
             pruned_coeffs = coeffs
-        values = chebpolyval(pruned_coeffs)
-        return self(values, scale)
+        # the values are only computed when needed
+        return self._from_coefficients(read_only(np.array(pruned_coeffs, dtype=np.result_type(pruned_coeffs, float))), scale, domain)
 
     @classmethod
-    def dichotomy(self, f, kmin=2, kmax=12, raise_no_convergence=True,):
+    def _from_coefficients(self, coeffs, scale, domain=None):
+        """
+        Chebfun holding only the given coefficients, without copying them; its values are computed when needed.
+        """
+        result = self.__new__(self)
+        result._initialise(None, coeffs, scale, domain)
+        return result
+
+    @classmethod
+    def dichotomy(self, f, kmin=2, kmax=12, raise_no_convergence=True, domain=None, chop=None, tol=None):
         """
         Compute the coefficients for a function f by dichotomy.
         kmin, kmax: log2 of number of interpolation points to try
         raise_no_convergence: whether to raise an exception if the dichotomy does not converge
+        domain: the interval [a, b] on which f is sampled; [-1, 1] if not given
+        chop: rule deciding when the coefficients are resolved, 'threshold' or 'plateau'; `chop` if not given
+        tol: relative tolerance; close to machine precision if not given
         """
+        coeffs, sampled = self._dichotomy(f, kmin, kmax, raise_no_convergence, domain, chop, tol)
+        return coeffs
 
-        for k in xrange(kmin, kmax):
-            N = pow(2, k)
+    @classmethod
+    def _dichotomy(self, f, kmin=2, kmax=12, raise_no_convergence=True, domain=None, chop=None, tol=None, sampled=None):
+        """
+        Dichotomy returning the coefficients and the values of f at the Chebyshev points of the last level.
+        sampled: optional values of f at N+1 Chebyshev points, from which the dichotomy continues
+        with 2N, 4N, ... points up to 2**(kmax-1), instead of starting at 2**kmin
+        """
+        if domain is not None:
+            f = compose_domain(f, domain)
 
-            sampled = sample_function(f, N)
+        if sampled is None:
+            levels = [pow(2, k) for k in xrange(kmin, kmax)]
+        else:
+            levels = [len(sampled) - 1]
+            while 2*levels[-1] < pow(2, kmax):
+                levels.append(2*levels[-1])
+
+        start = timer() if recorders else None
+        for N in levels:
+            if start is not None:
+                record('dichotomy_level', N+1)
+
+            # the Chebyshev points of the previous level are reused
+            if sampled is None or len(sampled) < N+1:
+                sampled = sample_function(f, N, sampled)
             coeffs = chebpolyfit(sampled)
 
-            # 3) Check for negligible coefficients
-            #    If within bound: get negligible coeffs and bread
-            bnd = self._threshold(np.max(np.abs(coeffs)))
-
-            last = abs(coeffs[-2:])
-            if np.all(last <= bnd):
+            if self._converged(coeffs, chop, tol):
                 break
         else:
+            if start is not None:
+                record('no_convergence', len(coeffs))
             if raise_no_convergence:
-                raise self.NoConvergence(last, bnd)
-        return coeffs
+                raise self.NoConvergence(abs(coeffs[-2:]), self._threshold(np.max(np.abs(coeffs)), tol))
+        if start is not None:
+            record('dichotomy', self._chop(coeffs, np.max(np.abs(coeffs)), chop, tol), timer() - start)
+        return coeffs, sampled
+
+    # default rule to decide when the coefficients of a sampled function are resolved, and where to chop them
+    chop = 'plateau'
+
+    # the plateau rule needs at least this number of coefficients; the threshold rule is used for fewer
+    plateau_size = 17
+
+    @classmethod
+    def _use_plateau(self, coeffs, chop):
+        if chop is None:
+            chop = self.chop
+        if chop not in ('threshold', 'plateau'):
+            raise ValueError("Unknown chopping rule {0}".format(chop))
+        return chop == 'plateau' and len(coeffs) >= self.plateau_size
 
     @classmethod
-    def from_function(self, f, N=None):
+    def _converged(self, coeffs, chop=None, tol=None):
         """
-        Initialise from a function to sample.
-        N: optional parameter which indicates the range of the dichotomy
+        Whether the coefficients are resolved:
+        either a plateau is found in their envelope, or the last coefficients are negligible.
         """
-        args = {'f': f}
+        if self._use_plateau(coeffs, chop):
+            return plateau_cutoff(coeffs, self._plateau_tol(tol)) is not None
+        bnd = self._threshold(np.max(np.abs(coeffs)), tol)
+        last = abs(coeffs[-2:])
+        return np.all(last <= bnd)
+
+    @classmethod
+    def _chop(self, coeffs, scale, chop=None, tol=None):
+        """
+        Number of coefficients to keep: up to the plateau of the envelope for the 'plateau' rule if there is one,
+        otherwise up to the last coefficient above the threshold.
+        """
+        if self._use_plateau(coeffs, chop):
+            N = plateau_cutoff(coeffs, self._plateau_tol(tol))
+            if N is not None:
+                return N
+        return self._cutoff(coeffs, scale, tol)
+
+    @classmethod
+    def _plateau_tol(self, tol):
+        if tol is None:
+            return emach
+        return tol
+
+    @classmethod
+    def _dichotomy_arguments(self, N=None):
+        """
+        Arguments of the dichotomy for the optional number of points N.
+        """
+        args = {}
         if N is not None: # N is provided
             nextpow2 = int(np.log2(N))+1
             args['kmin'] = nextpow2
@@ -157,26 +274,89 @@ class Chebfun(object):
             args['raise_no_convergence'] = False
         else:
             args['raise_no_convergence'] = True
+        return args
+
+    @classmethod
+    def from_function(self, f, N=None, domain=None, workers=None, executor=None, timeout=None, chop=None, tol=None, keep_samples=None):
+        """
+        Initialise from a function to sample.
+        N: optional parameter which indicates the range of the dichotomy
+        domain: the interval [a, b] on which f is sampled; [-1, 1] if not given
+        chop: chopping rule, 'threshold' or 'plateau'; `chop` if not given
+        tol: relative tolerance of the approximation; close to machine precision if not given
+        keep_samples: whether to keep the samples, so that `refine` reuses them; `keep_samples` if not given
+        workers: number of threads among which the sample points are distributed
+        executor: pool among which the sample points are distributed instead, e.g., a multiprocessing.Pool
+        timeout: seconds allowed for each sample point
+        With workers or executor, f may also be a function of a scalar only (see `BatchSampler`).
+        """
+        if workers is not None or executor is not None:
+            with BatchSampler(f, workers, executor, timeout) as sampler:
+                return self.from_function(sampler, N, domain, chop=chop, tol=tol, keep_samples=keep_samples)
+        if chop is None:
+            chop = self.chop
+        args = self._dichotomy_arguments(N)
+        args.update(f=f, domain=domain, chop=chop, tol=tol)
 
         # Find out the right number of coefficients to keep
-        coeffs = self.dichotomy(**args)
+        coeffs, sampled = self._dichotomy(**args)
+
+        result = self.from_chebcoeff(coeffs, scale=coefficient_scale(coeffs), domain=domain, chop=chop, tol=tol)
+        if keep_samples is None:
+            keep_samples = self.keep_samples
+        if keep_samples:
+            # the samples are kept to refine the chebfun later on; they may be the very array returned by f
+            result._samples = read_only(np.array(sampled))
+        return result
+
+    # whether `from_function` keeps the samples for `refine`; they take about twice as much memory as the coefficients
+    keep_samples = False
 
-        return self.from_chebcoeff(coeffs,)
+    def refine(self, f, tol=None, kmax=12, chop=None, keep_samples=None):
+        """
+        Approximation of f to the tolerance tol, starting from the samples of f kept by `from_function`,
+        or otherwise from f sampled again at the Chebyshev points of the chebfun,
+        since its values are only as accurate as the chebfun.
+        The dichotomy goes on with twice, four times, ... as many points, so no sample is computed again.
+        tol: relative tolerance; close to machine precision if not given
+        kmax: log2 of the largest number of interpolation points
+        chop: chopping rule, 'threshold' or 'plateau'; `chop` if not given
+        keep_samples: whether the result keeps its samples; only if this chebfun keeps its own if not given
+        """
+        if chop is None:
+            chop = self.chop
+        if keep_samples is None:
+            keep_samples = self._samples is not None
+        sampled = self._samples
+        if sampled is None and self.size() > 1:
+            sampled = sample_function(compose_domain(f, self._domain), self.size() - 1)
+        if sampled is not None and len(sampled) < 2:
+            # a single point is not a level of the dichotomy
+            sampled = None
+        coeffs, sampled = self._dichotomy(f, kmax=kmax, domain=self._domain, chop=chop, tol=tol, sampled=sampled)
+        result = self.from_chebcoeff(coeffs, scale=coefficient_scale(coeffs), domain=self._domain, chop=chop, tol=tol)
+        if keep_samples:
+            # the samples may be the very array returned by f
+            result._samples = read_only(np.array(sampled))
+        return result
 
     @classmethod
-    def _threshold(self, scale):
+    def _threshold(self, scale, tol=None):
         """
         Compute the threshold at which Chebyshev coefficients are trimmed.
+        tol: relative tolerance; 128 machine epsilons if not given
         """
-        bnd = 128*emach*scale
+        if tol is None:
+            tol = 128*emach
+        bnd = tol*scale
         return bnd
 
     @classmethod
-    def _cutoff(self, coeffs, scale):
+    def _cutoff(self, coeffs, scale, tol=None):
         """
         Compute cutoff index after which the coefficients are deemed negligible.
         """
-        bnd = self._threshold(scale)
+        bnd = self._threshold(scale, tol)
         inds  = np.nonzero(abs(coeffs) >= bnd)
         if len(inds[0]):
             N = inds[0][-1]
@@ -184,44 +364,119 @@ class Chebfun(object):
             N = 0
         return N+1
 
-    def __init__(self, values=0., scale=None):
+    def __init__(self, values=0., scale=None, domain=None):
         """
         Init a Chebfun objects from values at Chebyshev points.
         values: Interpolation values
         scale: The actual scale; computed automatically if not given
+        domain: The interval [a, b]; [-1, 1] if not given
         """
         avalues = np.asarray(values,)
         avalues1 = np.atleast_1d(avalues)
-        N = len(avalues1)
-        points = interpolation_points(N)
-        self._values = avalues1
-        if scale is not None:
-            self._scale = scale
-        else:
-            self._scale = np.max(np.abs(self._values))
-        self.p = interpolator(points, avalues1)
+        if scale is None:
+            scale = np.max(np.abs(avalues1))
+        self._initialise(avalues1, None, scale, domain)
+
+    def _initialise(self, values, coeffs, scale, domain):
+        """
+        Set the attributes from the values or the coefficients (either may be None, not both).
+        """
+        self._value_array = values # values at the Chebyshev points, computed lazily from the coefficients
+        self._coeffs = coeffs # Chebyshev coefficients, computed lazily from the values
+        self._dcoeffs = None # Chebyshev coefficients of the derivative, computed lazily
+        self._scale = scale
+        self._domain = domain_array(domain)
+        self._samples = None # values of the sampled function, kept by from_function
+        self._p = None # barycentric interpolator, created lazily
+        self._shared = None # file of the values and coefficients, for a shared chebfun
+
+    @property
+    def _values(self):
+        if self._value_array is None:
+            self._value_array = read_only(chebpolyval(self._coeffs))
+        return self._value_array
+
+    def _stored(self):
+        """
+        The values if they are computed, otherwise the coefficients; both have the same shape and dtype.
+        """
+        if self._value_array is None:
+            return self._coeffs
+        return self._value_array
+
+    @property
+    def p(self):
+        """
+        The barycentric interpolator of the values.
+        """
+        if self._p is None:
+            self._p = interpolator(interpolation_points(len(self._values)), self._values)
+        return self._p
+
+    # ----------------------------------------------------------------
+    # Pickling and sharing between processes
+    # ----------------------------------------------------------------
+
+    def __reduce__(self):
+        """
+        Only the values, or the coefficients if the values are not computed, the scale and the domain are pickled;
+        the interpolator is rebuilt when needed.
+        A shared chebfun is pickled as the name of its file.
+        """
+        if self._shared is not None:
+            return (attach_shared, (self._shared, self._values.shape, self._values.dtype.str, self._scale, self._domain))
+        return (restore, (self.__class__, self._stored(), self._value_array is None, self._scale, self._domain))
+
+    def share(self, directory=None):
+        """
+        A copy whose values and coefficients are in a memory-mapped file,
+        so that the processes to which it is sent map the same memory instead of each holding a copy.
+        The file is in /dev/shm when available; it should be removed with `unlink` once the workers are done.
+        directory: directory of the file
+        """
+        if directory is None:
+            directory = shared_directory()
+        handle, path = tempfile.mkstemp(suffix='.chebfun', dir=directory)
+        os.close(handle)
+        # the coefficients of integer values are not integers
+        dtype = np.result_type(self._values, float)
+        data = np.memmap(path, dtype=dtype, mode='w+', shape=(2,) + self._values.shape)
+        data[0] = self._values
+        data[1] = self.chebyshev_coefficients()
+        data.flush()
+        del data
+        return attach_shared(path, self._values.shape, dtype.str, self._scale, self._domain)
+
+    def unlink(self):
+        """
+        Remove the file of a shared chebfun; the existing mappings remain valid.
+        """
+        if self._shared is not None:
+            os.remove(self._shared)
 
     # ----------------------------------------------------------------
     # Standard construction class methods.
     # ----------------------------------------------------------------
 
     @classmethod
-    def identity(self):
+    def identity(self, domain=None):
         """
         The Chebfun for the identity function x -> x.
         """
-        return self.from_data([1., -1.])
+        if domain is None:
+            domain = default_domain
+        return self.from_data(np.array(domain, dtype=float)[::-1], domain)
 
     @classmethod
-    def basis(self, n):
+    def basis(self, n, domain=None):
         """
         Chebyshev basis functions T_n.
         """
         if n == 0:
-            return self(np.array([1.]))
+            return self(np.array([1.]), domain=domain)
         vals = np.ones(n+1)
         vals[1::2] = -1
-        return self(vals)
+        return self(vals, domain=domain)
 
     # ----------------------------------------------------------------
     # String representation
@@ -237,14 +492,131 @@ class Chebfun(object):
     # Basic Operator Overloads
     # ----------------------------------------------------------------
 
-    def __call__(self, x):
-        return self.p(x)
+    # approximate number of bytes of the intermediate arrays allocated by one evaluation
+    memory_budget = 2**27
+
+    # evaluation algorithms
+    algorithms = ('barycentric', 'clenshaw')
+
+    # bytes held at once by the barycentric formula per point and per Chebyshev point:
+    # the differences and their quotients by the weights (floats), and the mask of the coincident points (booleans)
+    barycentric_bytes = 17
+
+    # cost of one step of the Clenshaw loop, and of one barycentric evaluation, in elementary vector operations
+    clenshaw_overhead = 2500
+    barycentric_overhead = 13000
+
+    def evaluation_cost(self, M, algorithm):
+        """
+        Estimated cost of the evaluation at M points, in elementary vector operations.
+        The barycentric formula builds (M x N) arrays;
+        the Clenshaw recurrence loops N times over the M points and the components, with a fixed overhead per step.
+        """
+        N = self.size()
+        components = int(np.prod(self._stored().shape[1:]))
+        if np.iscomplexobj(self._stored()):
+            components *= 2
+        if algorithm == 'clenshaw':
+            return N*(self.clenshaw_overhead + M*components)
+        return self.barycentric_overhead + N*M*(6 + 2*components)
+
+    def evaluation_algorithm(self, M):
+        """
+        The cheapest algorithm to evaluate at M points, according to `evaluation_cost`.
+        """
+        return min(self.algorithms, key=lambda algorithm: self.evaluation_cost(M, algorithm))
+
+    def block_size(self, memory=None, algorithm='barycentric'):
+        """
+        Number of points evaluated at once, such that the intermediate arrays fit in the memory budget.
+        These are (M x N) arrays for the barycentric formula (see `barycentric_bytes`), and a few arrays of M values for Clenshaw.
+        """
+        if memory is None:
+            memory = self.memory_budget
+        components = max(int(np.prod(self._stored().shape[1:])), 1)
+        if algorithm == 'clenshaw':
+            per_point = 8*4*components
+        else:
+            per_point = self.barycentric_bytes*self.size() + 8*components
+        return max(1, int(memory // per_point))
+
+    def _evaluate(self, t, algorithm):
+        """
+        Values at points t of [-1, 1].
+        """
+        start = timer() if recorders else None
+        if algorithm == 'clenshaw':
+            values = clenshaw(self.chebyshev_coefficients(), t)
+        else:
+            values = self.p(t)
+        if start is not None:
+            record('evaluate.' + algorithm, np.size(t), timer() - start)
+        return values
+
+    # number of threads used for the evaluation; may be set globally or passed to each call
+    workers = 1
+
+    # largest number of points in one block; the blocks do not depend on the number of workers
+    grain = 2**15
+
+    def __call__(self, x, out=None, memory=None, algorithm=None, workers=None):
+        """
+        Evaluate at x, by blocks of `block_size` points (at most `grain`).
+        out: optional C-contiguous array of shape x.shape + values shape, where the result is written
+        memory: approximate memory budget in bytes; `memory_budget` if not given
+        algorithm: 'barycentric' or 'clenshaw'; chosen by `evaluation_algorithm` if not given
+        workers: number of threads among which the blocks are distributed; `workers` if not given
+        The result does not depend on the number of workers.
+        """
+        x = np.asarray(x)
+        if algorithm is None:
+            algorithm = self.evaluation_algorithm(x.size)
+        elif algorithm not in self.algorithms:
+            raise ValueError("Unknown algorithm {0}".format(algorithm))
+        if workers is None:
+            workers = self.workers
+        size = min(self.block_size(memory, algorithm), self.grain)
+        if out is None and x.size <= size:
+            return self._evaluate(from_domain(x, self._domain), algorithm)
+        shape = x.shape + self._stored().shape[1:]
+        if out is None:
+            out = np.empty(shape, dtype=np.result_type(self._stored(), float))
+        elif out.shape != shape:
+            raise ValueError("Output shape should be {0}".format(shape))
+        elif not out.flags.c_contiguous:
+            raise ValueError("Output array should be C-contiguous")
+        flat = x.reshape(-1)
+        flat_out = out.reshape((len(flat),) + self._stored().shape[1:])
+        starts = range(0, len(flat), size)
+        def evaluate(starts):
+            for start in starts:
+                block = flat[start:start+size]
+                flat_out[start:start+size] = self._evaluate(from_domain(block, self._domain), algorithm)
+        if workers > 1 and len(starts) > 1:
+            run_threads(evaluate, [starts[i::workers] for i in range(workers)])
+        else:
+            evaluate(starts)
+        return out
+
+    def evaluate_blocks(self, blocks, memory=None, algorithm=None):
+        """
+        Generator of the values block by block, to stream through data larger than the memory.
+        blocks: either an iterable of arrays of points, or one array (e.g., a np.memmap) which is split along its first axis
+        memory: approximate memory budget in bytes for each evaluation
+        algorithm: 'barycentric' or 'clenshaw'; chosen for each block if not given
+        """
+        if isinstance(blocks, np.ndarray):
+            size = max(1, self.block_size(memory)//max(int(np.prod(blocks.shape[1:])), 1))
+            points = blocks
+            blocks = (points[start:start+size] for start in xrange(0, len(points), size))
+        for block in blocks:
+            yield self(np.asarray(block), memory=memory, algorithm=algorithm)
 
     def __getitem__(self, s):
         """
         Components s of the chebfun.
         """
-        return Chebfun.from_data(self.values().T[s].T)
+        return Chebfun.from_data(self.values().T[s].T, self._domain)
 
     def __nonzero__(self):
         """
@@ -253,6 +625,8 @@ class Chebfun(object):
         return not np.allclose(self.chebyshev_coefficients(), 0)
 
     def __eq__(self, other):
+        if isinstance(other, Chebfun) and not self.same_domain(other):
+            return False
         return not(self - other)
 
     def __neq__(self, other):
@@ -263,6 +637,7 @@ class Chebfun(object):
         """
         Addition
         """
+        self._check_domain(other)
         ps = [self, other]
         # length difference
         diff = other.size() - self.size()
@@ -277,7 +652,7 @@ class Chebfun(object):
         # add the values and create a new Chebfun with them
         chebsum = big_coeffs + padded
         new_scale = np.max([self._scale, other._scale])
-        return self.from_chebcoeff(chebsum, scale=new_scale)
+        return self.from_chebcoeff(chebsum, scale=new_scale, domain=self._domain)
 
     __radd__ = __add__
 
@@ -292,6 +667,22 @@ class Chebfun(object):
     def __rsub__(self, other):
         return -(self - other)
 
+    @cast_scalar
+    def __mul__(self, other):
+        """
+        Multiplication, computed from the Chebyshev coefficients:
+        both factors are evaluated on a grid large enough to represent the product exactly.
+        """
+        self._check_domain(other)
+        self_coeffs = self.chebyshev_coefficients()
+        other_coeffs = other.chebyshev_coefficients()
+        N = len(self_coeffs) + len(other_coeffs) - 1
+        self_values = chebpolyval(pad_coefficients(self_coeffs, N))
+        other_values = chebpolyval(pad_coefficients(other_coeffs, N))
+        prod_coeffs = chebpolyfit((self_values.T * other_values.T).T)
+        # pruned relative to the size of the product, as in from_function
+        return self.from_chebcoeff(prod_coeffs, scale=coefficient_scale(prod_coeffs), domain=self._domain)
+
     def __rmul__(self, other):
         return self.__mul__(other)
 
@@ -305,25 +696,93 @@ class Chebfun(object):
         """
         Chebfun negation.
         """
-        return self.from_data(-self.values())
+        return self.from_data(-self.values(), self._domain)
 
 
     def __abs__(self):
-        return self.from_function(lambda x: abs(self(x)))
+        return self.from_function(lambda x: abs(self(x)), domain=self._domain)
+
+    def lazy(self):
+        """
+        Start a lazy expression: operations on the result are recorded, not computed.
+        """
+        return LazyChebfun(self, domain=self._domain)
 
     # ----------------------------------------------------------------
     # Attributes
     # ----------------------------------------------------------------
 
     def size(self):
-        return self.p.n
+        return len(self._stored())
+
+    def domain(self):
+        """
+        The interval [a, b] on which the Chebfun is defined.
+        """
+        return self._domain
+
+    def same_domain(self, other):
+        return np.array_equal(self._domain, other.domain())
+
+    def _check_domain(self, other):
+        """
+        Raise DomainMismatch if other is defined on another domain.
+        """
+        if not self.same_domain(other):
+            raise self.DomainMismatch(self._domain, other.domain())
+
+    def points(self):
+        """
+        The interpolation points, in the domain.
+        """
+        return to_domain(interpolation_points(self.size()), self._domain)
+
+    def restrict(self, subdomain):
+        """
+        The Chebfun restricted to a subinterval of its domain.
+        """
+        a, b = from_domain(np.asarray(subdomain, dtype=float), self._domain)
+        coeffs = restrict_coefficients(self.chebyshev_coefficients(), a, b)
+        return self.from_chebcoeff(coeffs, domain=subdomain)
 
     def chebyshev_coefficients(self):
-        return chebpolyfit(self.values())
+        """
+        Chebyshev coefficients; computed once from the values, then cached.
+        """
+        if self._coeffs is None:
+            # for a single value, the coefficients are the values themselves
+            self._coeffs = read_only(chebpolyfit(self.values()), self._value_array)
+        return self._coeffs
 
     def values(self):
         return self._values
 
+    def footprint(self):
+        """
+        Memory held by the chebfun, in bytes, by component.
+        The arrays shared by all the chebfuns (default domain, Chebyshev points, weights)
+        and those mapped from a file (shared chebfuns, libraries) are not counted.
+        """
+        interpolator = 0
+        if self._p is not None:
+            # the interpolator refers to the values and to the cached points and weights
+            interpolator = sys.getsizeof(self._p) + sys.getsizeof(self._p.__dict__)
+        return {
+            'object': sys.getsizeof(self),
+            'values': owned_nbytes(self._value_array),
+            'coefficients': owned_nbytes(self._coeffs),
+            'derivative': owned_nbytes(self._dcoeffs),
+            'samples': owned_nbytes(self._samples),
+            'domain': 0 if self._domain is default_domain else owned_nbytes(self._domain),
+            'interpolator': interpolator,
+            }
+
+    def nbytes(self):
+        """
+        Total memory held by the chebfun, in bytes (see `footprint`).
+        """
+        return sum(self.footprint().values())
+
     # ----------------------------------------------------------------
     # Integration and derivation
     # ----------------------------------------------------------------
@@ -334,19 +793,37 @@ class Chebfun(object):
         Clenshaw-Curtis quadrature.
         """
         ai = self.chebyshev_coefficients()
-        ai2 = ai[::2]
-        n = len(ai2)
-        Tints = 2/(1-(2*np.arange(n))**2)
-        val = np.sum((Tints*ai2.T).T, axis=0)
+        val = np.dot(quadrature_weights(len(ai)), ai)
+        return val*self._half_length()
 
-        return val
+    def _half_length(self):
+        """
+        Half the length of the domain: the derivative of the map from [-1, 1] to the domain.
+        """
+        a, b = self._domain
+        return (b-a)/2
 
     def dot(self, other):
         """
-        Return the Hilbert scalar product $\int f.g$.
+        Return the Hilbert scalar product $\int f.g$, computed from the Chebyshev coefficients.
+        other: a Chebfun on the same domain, or a scalar
         """
-        prod = self * other
-        return prod.sum()
+        if np.isscalar(other):
+            other = Chebfun([other], domain=self.domain())
+        elif not isinstance(other, Chebfun):
+            raise TypeError('Impossible to compute the scalar product of a Chebfun with an object of type {}'.format(type(other)))
+        self._check_domain(other)
+        a = self.chebyshev_coefficients()
+        b = other.chebyshev_coefficients()
+        a2 = a.reshape(len(a), -1)
+        b2 = b.reshape(len(b), -1)
+        # the columns paired by broadcasting the shapes of the values
+        try:
+            columns_a, columns_b = np.broadcast_arrays(np.arange(a2.shape[1]).reshape(a.shape[1:]), np.arange(b2.shape[1]).reshape(b.shape[1:]))
+        except ValueError:
+            raise ValueError('Impossible to compute the scalar product of chebfuns with values of shapes {} and {}'.format(a.shape[1:], b.shape[1:]))
+        values = [coefficient_dot(a2[:, i], b2[:, j]) for i, j in zip(columns_a.ravel(), columns_b.ravel())]
+        return np.array(values).reshape(columns_a.shape)*self._half_length()
 
     def norm(self):
         """
@@ -357,11 +834,12 @@ class Chebfun(object):
 
     def integrate(self):
         """
-        Return the Chebfun representing the primitive of self over the domain, starting at zero.
+        Return the Chebfun representing the primitive of self over the domain,
+        starting at the centre of the domain (zero for [-1, 1]).
         """
         coeffs = self.chebyshev_coefficients()
-        int_coeffs = poly.chebyshev.chebint(coeffs)
-        return self.from_chebcoeff(int_coeffs)
+        int_coeffs = poly.chebyshev.chebint(coeffs)*self._half_length()
+        return self.from_chebcoeff(int_coeffs, domain=self._domain)
 
     def derivative(self):
         return self.differentiate()
@@ -370,27 +848,118 @@ class Chebfun(object):
         """
         n-th derivative
         """
-        bi = self.chebyshev_coefficients()
-        for _ in range(n):
-            bi = differentiator(bi)
-        return self.from_chebcoeff(chebcoeff=bi)
+        return self.from_chebcoeff(chebcoeff=self.derivative_coefficients(n), domain=self._domain)
+
     # ----------------------------------------------------------------
     # Roots
     # ----------------------------------------------------------------
 
-    def roots(self):
+    def roots(self, complex_roots=False, rho=1.2):
         """
-        Return the roots if the Chebfun is scalar
-        The computation is done via trigonometric polynomials
+        Return the roots if the Chebfun is scalar, in sorted order.
+        The roots are the eigenvalues of colleague matrices; above `colleague_size` coefficients,
+        the interval is recursively split so that the cost grows roughly like N**2.
+        complex_roots: also return the complex roots inside the Bernstein ellipse with parameter rho
+        (computed without splitting)
         """
         ai = self.chebyshev_coefficients()
-        N = len(ai)
-        coeffs = np.hstack([ai[-1::-1], ai[1:]])
-        coeffs[N-1] *= 2
-        complex_roots = poly.polynomial.polyroots(coeffs)
-        real_roots = np.array([np.real(r) for r in complex_roots if np.allclose(abs(r), 1.)])
-        roots = np.unique(real_roots)
-        return roots
+        scale = np.max(np.abs(ai))
+        if scale == 0:
+            # the zero function
+            roots = np.array([])
+        elif complex_roots:
+            roots = chebroots(ai[:self._cutoff(ai, scale)])
+            roots = np.sort(roots[bernstein_parameter(roots) < rho])
+        else:
+            roots = real_roots(ai, scale, self.colleague_size)
+        return to_domain(roots, self._domain)
+
+    # largest number of coefficients handled by a single colleague matrix in roots
+    colleague_size = 50
+
+    # ----------------------------------------------------------------
+    # Extrema
+    # ----------------------------------------------------------------
+
+    def derivative_coefficients(self, n=1):
+        """
+        Chebyshev coefficients of the n-th derivative; those of the first derivative are computed once, then cached.
+        """
+        if n != 1:
+            return chebdiff(self.chebyshev_coefficients(), n)/self._half_length()**n
+        if self._dcoeffs is None:
+            self._dcoeffs = read_only(chebdiff(self.chebyshev_coefficients())/self._half_length())
+        return self._dcoeffs
+
+    def _critical_points(self, dcoeffs):
+        """
+        Sorted endpoints and roots of the derivative with coefficients dcoeffs, in the domain.
+        """
+        scale = np.max(np.abs(dcoeffs))
+        if scale > 0:
+            roots = real_roots(dcoeffs, scale, self.colleague_size)
+        else:
+            roots = np.array([])
+        return to_domain(np.unique(np.concatenate([[-1.], roots, [1.]])), self._domain)
+
+    def extrema(self):
+        """
+        Candidate extrema: the endpoints and the roots of the derivative.
+        Return the pair (points, values) for a scalar chebfun, and a list of such pairs,
+        one per component, for a vector chebfun.
+        """
+        dcoeffs = self.derivative_coefficients()
+        if dcoeffs.ndim == 1:
+            points = self._critical_points(dcoeffs)
+            return points, self(points)
+        points = [self._critical_points(dcoeffs[:, j]) for j in range(dcoeffs.shape[1])]
+        # evaluate all the candidates at once
+        values = self(np.concatenate(points))
+        result = []
+        start = 0
+        for j, x in enumerate(points):
+            result.append((x, values[start:start+len(x), j]))
+            start += len(x)
+        return result
+
+    def _optimum(self, pick):
+        """
+        Point and value selected by pick (np.argmin or np.argmax) among the extrema;
+        arrays with one entry per component for a vector chebfun.
+        """
+        extrema = self.extrema()
+        if isinstance(extrema, tuple):
+            x, v = extrema
+            i = pick(v)
+            return x[i], v[i]
+        indices = [pick(v) for x, v in extrema]
+        points = np.array([x[i] for i, (x, v) in zip(indices, extrema)])
+        values = np.array([v[i] for i, (x, v) in zip(indices, extrema)])
+        return points, values
+
+    def min(self):
+        """
+        Global minimum over the domain.
+        """
+        return self._optimum(np.argmin)[1]
+
+    def max(self):
+        """
+        Global maximum over the domain.
+        """
+        return self._optimum(np.argmax)[1]
+
+    def argmin(self):
+        """
+        Point in the domain where the global minimum is attained.
+        """
+        return self._optimum(np.argmin)[0]
+
+    def argmax(self):
+        """
+        Point in the domain where the global maximum is attained.
+        """
+        return self._optimum(np.argmax)[0]
 
     # ----------------------------------------------------------------
     # Plotting Methods
@@ -421,13 +990,13 @@ class Chebfun(object):
         """
         Plot data depending on the dimension of the chebfun.
         """
-        ts = np.linspace(-1, 1, self.plot_res)
+        ts = np.linspace(self._domain[0], self._domain[1], self.plot_res)
         values = self(ts)
         dim, dof = self.dimension_info()
         if 1 == dim and 1 == dof: # 1D real
             xs = ts
             ys = values
-            xi = self.p.xi
+            xi = self.points()
             yi = self.values()
             d = 1
         elif 2 == dim and 1 == dof: # 2D real
@@ -476,7 +1045,7 @@ class Chebfun(object):
         return ax
 
     def plot_interpolating_points(self):
-        plt.plot(self.p.xi, self.values())
+        plt.plot(self.points(), self.values())
 
     def compare(self, f, *args, **kwds):
         """
@@ -486,7 +1055,7 @@ class Chebfun(object):
 
             -- f: Python, Numpy, or Sage function
         """
-        x   = np.linspace(-1, 1, 10000)
+        x   = np.linspace(self._domain[0], self._domain[1], 10000)
         fig = plt.figure()
         ax  = fig.add_subplot(211)
         
@@ -506,7 +1075,8 @@ class Chebfun(object):
 
 def _add_operator(op):
     def method(self, other):
-        return self.from_function(lambda x: op(self(x).T, other(x).T).T,)
+        self._check_domain(other)
+        return self.from_function(lambda x: op(self(x).T, other(x).T).T, domain=self._domain)
     cast_method = cast_scalar(method)
     name = op.__name__
     cast_method.__name__ = name
@@ -516,7 +1086,7 @@ def _add_operator(op):
 def __rdiv__(a, b):
     return b/a
 
-for _op in [operator.__mul__, operator.__div__, operator.__pow__, __rdiv__]:
+for _op in [operator.__div__, operator.__pow__, __rdiv__]:
     _add_operator(_op)
 
 # ----------------------------------------------------------------
@@ -525,7 +1095,7 @@ for _op in [operator.__mul__, operator.__div__, operator.__pow__, __rdiv__]:
 
 def _add_delegate(ufunc):
     def method(self):
-        return self.from_function(lambda x: ufunc(self(x)))
+        return self.from_function(lambda x: ufunc(self(x)), domain=self._domain)
     name = ufunc.__name__
     method.__name__ = name
     method.__doc__ = "delegate for numpy's ufunc {}".format(name)
@@ -533,9 +1103,112 @@ def _add_delegate(ufunc):
 
 # Following list generated from:
 # https://github.com/qsnake/numpy/blob/master/numpy/core/code_generators/generate_umath.py
-for func in [np.arccos, np.arccosh, np.arcsin, np.arcsinh, np.arctan, np.arctanh, np.cos, np.sin, np.tan, np.cosh, np.sinh, np.tanh, np.exp, np.exp2, np.expm1, np.log, np.log2, np.log1p, np.sqrt, np.ceil, np.trunc, np.fabs, np.floor, ]:
+ufuncs = [np.arccos, np.arccosh, np.arcsin, np.arcsinh, np.arctan, np.arctanh, np.cos, np.sin, np.tan, np.cosh, np.sinh, np.tanh, np.exp, np.exp2, np.expm1, np.log, np.log2, np.log1p, np.sqrt, np.ceil, np.trunc, np.fabs, np.floor, ]
+for func in ufuncs:
     _add_delegate(func)
 
+# ----------------------------------------------------------------
+# Lazy expressions
+# ----------------------------------------------------------------
+
+class LazyChebfun(object):
+    """
+    Pointwise expression of chebfuns whose construction is deferred.
+    Operators and ufunc delegates only record the expression;
+    the result is built once, by sampling the fused expression, when `chebfun` is called.
+    """
+    def __init__(self, fun, operations=0, domain=None):
+        """
+        fun: callable evaluating the expression
+        operations: number of recorded operations, each of which would otherwise construct a Chebfun
+        domain: the domain of the chebfuns in the expression; None if there are none
+        """
+        self._fun = fun
+        self.operations = operations
+        self.domain = domain
+
+    @classmethod
+    def from_operand(self, other):
+        """
+        Wrap a Chebfun, a scalar or a LazyChebfun as a LazyChebfun.
+        """
+        if isinstance(other, LazyChebfun):
+            return other
+        if np.isscalar(other):
+            return self(lambda x: np.asarray(other))
+        return self(other, domain=other.domain())
+
+    def common_domain(self, other):
+        """
+        The domain of an expression combining self and other.
+        """
+        if self.domain is None:
+            return other.domain
+        if other.domain is not None and not np.array_equal(self.domain, other.domain):
+            raise Chebfun.DomainMismatch(self.domain, other.domain)
+        return self.domain
+
+    def __call__(self, x):
+        return self._fun(x)
+
+    def __repr__(self):
+        return "<LazyChebfun({0})>".format(self.operations)
+
+    def __neg__(self):
+        return LazyChebfun(lambda x: -self(x), self.operations + 1, self.domain)
+
+    def avoided(self):
+        """
+        Number of intermediate constructions avoided by building the expression at once.
+        """
+        return max(self.operations - 1, 0)
+
+    def chebfun(self, N=None):
+        """
+        Construct the Chebfun of the whole expression.
+        """
+        return Chebfun.from_function(self, N, domain=self.domain)
+
+def _add_lazy_operator(op):
+    def method(self, other):
+        other = self.from_operand(other)
+        def fun(x):
+            return op(self(x).T, other(x).T).T
+        return LazyChebfun(fun, self.operations + other.operations + 1, self.common_domain(other))
+    name = op.__name__
+    method.__name__ = name
+    method.__doc__ = "lazy operator {}".format(name)
+    setattr(LazyChebfun, name, method)
+
+def __radd__(a, b):
+    return b + a
+
+def __rsub__(a, b):
+    return b - a
+
+def __rmul__(a, b):
+    return b * a
+
+def __rtruediv__(a, b):
+    return b / a
+
+def __rpow__(a, b):
+    return b ** a
+
+for _op in [operator.__add__, operator.__sub__, operator.__mul__, operator.__div__, operator.__truediv__, operator.__pow__, __radd__, __rsub__, __rmul__, __rdiv__, __rtruediv__, __rpow__]:
+    _add_lazy_operator(_op)
+
+def _add_lazy_delegate(ufunc):
+    def method(self):
+        return LazyChebfun(lambda x: ufunc(self(x)), self.operations + 1, self.domain)
+    name = ufunc.__name__
+    method.__name__ = name
+    method.__doc__ = "lazy delegate for numpy's ufunc {}".format(name)
+    setattr(LazyChebfun, name, method)
+
+for func in ufuncs:
+    _add_lazy_delegate(func)
+
 
 # ----------------------------------------------------------------
 # Interpolation and evaluation (go from values to coefficients)
@@ -547,34 +1220,529 @@ def even_data(data):
     even extension of the original function)
     Return: array of length 2(N-1)
     For instance, [0,1,2,3,4] --> [0,1,2,3,4,3,2,1]
+    Deprecated: no longer used by the library, whose transforms use the real DCT-I of `dct1`;
+    only kept, with `dct`, as a reference implementation.
     """
     return np.concatenate([data, data[-2:0:-1]],)
 
+default_domain = np.array([-1., 1.])
+default_domain.flags.writeable = False
+
+def domain_array(domain):
+    """
+    The domain as a read-only array; the default domain is shared by all the chebfuns defined on [-1, 1].
+    """
+    if domain is None:
+        return default_domain
+    domain = np.array(domain, dtype=float)
+    if np.array_equal(domain, default_domain):
+        return default_domain
+    return read_only(domain)
+
+def coefficient_scale(coeffs, axis=None):
+    """
+    Largest absolute value of the coefficients (along axis), or 1 where they are all zero.
+    """
+    scale = np.max(np.abs(coeffs), axis=axis)
+    return np.where(scale > 0, scale, 1.)[()]
+
+def owned_nbytes(array):
+    """
+    Bytes of an array, or zero if it is None or a view of a memory-mapped file.
+    """
+    if array is None:
+        return 0
+    base = array
+    while base is not None:
+        if isinstance(base, (np.memmap, mmap.mmap)):
+            return 0
+        base = getattr(base, 'base', None)
+    return array.nbytes
+
+def read_only(array, source=None):
+    """
+    Mark an array owned by a chebfun as read-only, so that it may be shared.
+    source: an array which the chebfun does not own, such as values given by the caller;
+    the array is copied first if it shares memory with it
+    """
+    if source is not None and np.may_share_memory(array, source):
+        array = array.copy()
+    array.flags.writeable = False
+    return array
+
+def to_domain(t, domain):
+    """
+    Map points t of [-1, 1] affinely to the domain [a, b]; the endpoints are mapped exactly.
+    """
+    a, b = domain
+    if a == -1 and b == 1:
+        return t
+    return a*(1-t)/2 + b*(1+t)/2
+
+def from_domain(x, domain):
+    """
+    Map points x of the domain [a, b] affinely to [-1, 1].
+    """
+    a, b = domain
+    if a == -1 and b == 1:
+        return x
+    return (2*np.asarray(x) - (a+b))/(b-a)
+
+def compose_domain(f, domain):
+    """
+    The function t -> f(x(t)) on [-1, 1], for a function f on the domain [a, b].
+    """
+    a, b = domain
+    if a == -1 and b == 1:
+        return f
+    return lambda t: f(to_domain(t, domain))
+
+def shared_directory():
+    """
+    Directory of the files of shared chebfuns: /dev/shm if it exists, otherwise the temporary directory.
+    """
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+def restore(cls, stored, coefficients, scale, domain):
+    """
+    The pickled chebfun of class cls, from its values, or from its coefficients if `coefficients` is true.
+    """
+    if coefficients:
+        return cls._from_coefficients(read_only(stored), scale, domain)
+    return cls(stored, scale, domain)
+
+def attach_shared(path, shape, dtype, scale, domain):
+    """
+    The shared chebfun whose values and coefficients are in the file at path, mapped read-only.
+    """
+    data = np.asarray(np.memmap(path, dtype=np.result_type(np.dtype(dtype), float), mode='r', shape=(2,) + tuple(shape)))
+    result = Chebfun(data[0], scale, domain)
+    result._coeffs = data[1]
+    result._shared = path
+    return result
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+class SizeCache(object):
+    """
+    Bounded LRU cache of read-only arrays which only depend on a size,
+    such as the Chebyshev points or the quadrature weights.
+    It holds at most `maxsize` values, of at most `maxbytes` bytes in total (see `cached_nbytes`);
+    a value larger than `maxbytes` is not kept.
+    One instance, `size_cache`, is shared by all the chebfuns of the process.
+    """
+    def __init__(self, maxsize=256, maxbytes=2**25):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+
+    def get(self, key, compute):
+        """
+        The value for key, computed by compute() if it is not cached.
+        The arrays in the value are made read-only, since they are shared.
+        """
+        with self._lock:
+            try:
+                value, nbytes = self._data.pop(key)
+            except KeyError:
+                pass
+            else:
+                self.hits += 1
+                self._data[key] = value, nbytes
+                return value
+        value = compute()
+        for array in (value if isinstance(value, tuple) else (value,)):
+            if isinstance(array, np.ndarray):
+                array.flags.writeable = False
+        nbytes = cached_nbytes(value)
+        with self._lock:
+            self.misses += 1
+            if key in self._data:
+                # computed meanwhile in another thread
+                self.nbytes -= self._data.pop(key)[1]
+            self._data[key] = value, nbytes
+            self.nbytes += nbytes
+            while len(self._data) > self.maxsize or self.nbytes > self.maxbytes:
+                self.nbytes -= self._data.popitem(last=False)[1][1]
+        return value
+
+    def info(self):
+        """
+        Hit and miss statistics.
+        """
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+    def clear(self):
+        """
+        Empty the cache and reset the statistics.
+        """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.nbytes = 0
+
+def cached_nbytes(value):
+    """
+    Bytes of the arrays and sparse matrices of a cached value.
+    """
+    nbytes = 0
+    for item in (value if isinstance(value, tuple) else (value,)):
+        if isinstance(item, np.ndarray):
+            nbytes += item.nbytes
+        elif sparse.isspmatrix_csr(item):
+            nbytes += item.data.nbytes + item.indices.nbytes + item.indptr.nbytes
+    return nbytes
+
+size_cache = SizeCache()
+
 def interpolation_points(N):
     """
-    N Chebyshev points in [-1, 1], boundaries included
+    N Chebyshev points in [-1, 1], boundaries included (read-only)
     """
+    return size_cache.get(('points', N), lambda: _interpolation_points(N))
+
+def _interpolation_points(N):
     if N == 1:
         return np.array([0.])
     return np.cos(np.arange(N)*np.pi/(N-1))
 
-def sample_function(f, N):
+def barycentric_weights(N):
+    """
+    Barycentric weights for N Chebyshev points (read-only)
+    """
+    def compute():
+        weights = np.ones(N)
+        weights[0] = .5
+        weights[1::2] = -1
+        weights[-1] *= .5
+        return weights
+    return size_cache.get(('weights', N), compute)
+
+def quadrature_weights(N):
+    """
+    Clenshaw-Curtis weights: the integrals over [-1, 1] of the first N Chebyshev polynomials (read-only)
+    """
+    def compute():
+        weights = np.zeros(N)
+        weights[::2] = 2/(1-(2*np.arange((N+1)//2))**2)
+        return weights
+    return size_cache.get(('quadrature', N), compute)
+
+def product_weights(N):
+    """
+    Matrix of the integrals over [-1, 1] of the products T_i T_j, for i, j < N (read-only).
+    Since T_i T_j = (T_{i+j} + T_{|i-j|})/2, it is computed from the quadrature weights.
+    """
+    def compute():
+        weights = quadrature_weights(2*N-1)
+        i = np.arange(N)
+        return (weights[i[:, np.newaxis] + i] + weights[np.abs(i[:, np.newaxis] - i)])/2
+    return size_cache.get(('product', N), compute)
+
+def product_weights_dot(coeffs):
+    """
+    The product of the matrix `product_weights` by the (N, m) matrix coeffs.
+    Above `matrix_transform_size`, the matrix is not formed: its Hankel part (weights w_{i+j})
+    and its Toeplitz part (weights w_{|i-j|}) are applied to the columns as convolutions, by FFT.
+    """
+    coeffs = np.asarray(coeffs)
+    N = len(coeffs)
+    if N <= matrix_transform_size:
+        return np.dot(product_weights(N), coeffs)
+    weights = quadrature_weights(2*N-1)
+    # the Toeplitz kernel w_{|l|} for the lags l = -(N-1), ..., N-1
+    kernel = np.concatenate([weights[N-1:0:-1], weights[:N]])
+    size = 2**int(np.ceil(np.log2(4*N-3)))
+    shape = (-1,) + (1,)*(coeffs.ndim - 1)
+    transform = np.fft.rfft(coeffs, size, axis=0)
+    reversed_transform = np.fft.rfft(coeffs[::-1], size, axis=0)
+    hankel = np.fft.irfft(np.fft.rfft(weights, size).reshape(shape)*reversed_transform, size, axis=0)
+    toeplitz = np.fft.irfft(np.fft.rfft(kernel, size).reshape(shape)*transform, size, axis=0)
+    return (hankel[N-1:2*N-1] + toeplitz[N-1:2*N-1])/2
+
+def coefficient_dot(a, b):
+    """
+    Integral over [-1, 1] of the product of the scalar Chebyshev series a and b.
+    The double sum over the product weights is split into a convolution (indices i+j)
+    and a correlation (indices |i-j|), so that no matrix is formed.
+    Above `matrix_transform_size`, these are computed by FFT in `product_weights_dot`.
+    """
+    N = max(len(a), len(b))
+    if N > matrix_transform_size:
+        return np.dot(pad_coefficients(a, N), product_weights_dot(pad_coefficients(b, N)))
+    weights = quadrature_weights(len(a) + len(b) - 1)
+    convolution = np.convolve(a, b)
+    correlation = np.convolve(a, b[::-1])
+    lags = np.abs(np.arange(len(correlation)) - (len(b) - 1))
+    return (np.dot(weights, convolution) + np.dot(weights[lags], correlation))/2
+
+def plateau_cutoff(coeffs, tol=emach):
+    """
+    Number of coefficients to keep, where the envelope of the coefficients levels off in a plateau,
+    or None if there is no plateau, i.e., if the coefficients are not resolved.
+    This is the chopping rule of Aurentz & Trefethen, "Chopping a Chebyshev series" (2017):
+    the plateau is found on the monotone envelope, normalised by its largest value,
+    and the cutoff is then placed at the minimum of the log envelope plus a linear function.
+    tol: relative tolerance
+    """
+    coeffs = np.asarray(coeffs)
+    b = np.max(np.abs(coeffs).reshape(len(coeffs), -1), axis=1)
+    N = plateau_cutoffs(b[:, np.newaxis], tol)[0]
+    if N == 0:
+        return None
+    return int(N)
+
+def plateau_search(magnitudes, tol):
+    """
+    The normalised envelope of each column of an (n, m) array of absolute values of coefficients,
+    the columns which are zero, and the candidate indices j, j2 of `plateau_cutoff` with,
+    for each column, whether a plateau starts at j.
+    """
+    n, m = magnitudes.shape
+    envelope = np.maximum.accumulate(magnitudes[::-1], axis=0)[::-1]
+    zero = envelope[0] == 0
+    envelope = envelope/np.where(zero, 1., envelope[0])
+    # indices are counted from one, as in the article; all the candidates j are tested at once
+    j = np.arange(2, n+1)
+    j2 = np.floor(1.25*j + 5.5).astype(int)
+    j, j2 = j[j2 <= n], j2[j2 <= n]
+    e1 = envelope[1:len(j)+1] # envelope[j-1]
+    e2 = envelope[j2-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # e2/e1 > 3*(1 - log(e1)/log(tol)), without dividing by zero
+        found = (e1 == 0) | (e2 > 3*e1*(1 - np.log(e1)/np.log(tol)))
+    return envelope, zero, j, j2, found
+
+def plateau_resolved(magnitudes, tol=emach):
+    """
+    Whether each column of an (n, m) array of absolute values of coefficients has a plateau (see `plateau_cutoff`).
+    """
+    envelope, zero, j, j2, found = plateau_search(magnitudes, tol)
+    return zero | np.any(found, axis=0)
+
+def plateau_cutoffs(magnitudes, tol=emach):
+    """
+    `plateau_cutoff` of each column of an (n, m) array of absolute values of coefficients,
+    computed for all the columns at once; 0 for the columns without a plateau.
+    """
+    n, m = magnitudes.shape
+    columns = np.arange(m)
+    envelope, zero, j, j2, found = plateau_search(magnitudes, tol)
+    if not len(j):
+        return np.where(zero, 1, 0)
+    resolved = np.any(found, axis=0)
+    first = np.argmax(found, axis=0)
+    plateau, last = j[first] - 1, j2[first]
+    exact = envelope[plateau-1, columns] == 0
+    floor = tol**(7/6)
+    j3 = np.sum(envelope >= floor, axis=0)
+    lower = j3 < last
+    last = np.where(lower, j3 + 1, last)
+    envelope[j3[lower], columns[lower]] = floor
+    # log envelope plus a line from 0 to -log10(tol)/3 over its first `last` entries
+    rows = np.arange(np.max(last))[:, np.newaxis]
+    slope = -np.log10(tol)/3/np.maximum(last - 1, 1)
+    with np.errstate(divide='ignore'):
+        cc = np.log10(envelope[:len(rows)]) + rows*slope
+    cc[rows >= last] = np.inf
+    cutoffs = np.maximum(np.argmin(cc, axis=0), 1)
+    cutoffs = np.where(exact, plateau, cutoffs)
+    cutoffs[~resolved] = 0
+    cutoffs[zero] = 1
+    return cutoffs
+
+def sample_batch(f, batch, vectorized):
+    """
+    Values of f at the points of batch, in one call if f is vectorized, otherwise point by point.
+    """
+    if vectorized:
+        try:
+            return np.asarray(f(batch))
+        except Exception as error:
+            raise SamplingError(batch, error)
+    values = []
+    for x in batch:
+        try:
+            values.append(f(x))
+        except Exception as error:
+            raise SamplingError(np.array([x]), error)
+    return np.array(values)
+
+def is_vectorized(f, x):
+    """
+    Whether f, called on the array x, returns one value per point.
+    """
+    try:
+        values = np.asarray(f(x))
+    except Exception:
+        return False
+    return values.ndim > 0 and len(values) == len(x)
+
+class BatchSampler(object):
+    """
+    Vectorized function which distributes batches of points to a pool of workers,
+    and gathers the values in order.
+    Whether f is vectorized is detected on the first call, by evaluating it at two points.
+    A function of a scalar only is then evaluated point by point in each batch;
+    with a timeout, each of its points is submitted on its own, so that it is waited for separately.
+    Use as a context manager; a pool of `workers` threads is created if no executor is given.
+    If sampling fails, that pool is terminated without waiting for the calls still running.
+    """
+
+    # number of batches per worker
+    batches_per_worker = 4
+
+    def __init__(self, f, workers=None, executor=None, timeout=None):
+        """
+        f: function to sample
+        workers: number of workers
+        executor: pool of workers with an `apply_async` method (multiprocessing pools) or a `submit` method (concurrent.futures executors)
+        timeout: seconds allowed per point, counted from the time the previous result is received;
+        a vectorized function is called once per batch, and has n*timeout seconds for a batch of n points
+        """
+        self.f = f
+        self.workers = workers
+        self.executor = executor
+        self.timeout = timeout
+        self.vectorized = None
+        self._pool = None
+
+    def __enter__(self):
+        if self.executor is None:
+            from multiprocessing.pool import ThreadPool
+            self._pool = ThreadPool(self.workers or 1)
+            self.executor = self._pool
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._pool is not None:
+            self._pool.terminate()
+            if exc_type is None:
+                self._pool.join()
+            # otherwise a call which timed out may never return: it is left to its daemon thread
+            self.executor = self._pool = None
+
+    def submit(self, function, *args):
+        """
+        Submit function(*args) to the executor, and return a function waiting for its value.
+        """
+        if hasattr(self.executor, 'submit'):
+            future = self.executor.submit(function, *args)
+            return future.result
+        result = self.executor.apply_async(function, args)
+        return result.get
+
+    def wait(self, points, wait):
+        """
+        Wait for the values at the given points, at most timeout seconds per point.
+        """
+        if self.timeout is None:
+            # waiting without timeout is not interruptible on Python 2
+            timeout = 1e9
+        else:
+            timeout = self.timeout*len(points)
+        try:
+            return wait(timeout)
+        except SamplingError:
+            raise
+        except Exception as error:
+            # time out
+            raise SamplingError(points, error)
+
+    def __call__(self, x):
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        if self.vectorized is None:
+            self.vectorized = self.wait(x[:2], self.submit(is_vectorized, self.f, x[:2]))
+        if self.timeout is not None and not self.vectorized:
+            size = 1
+        else:
+            batches = (self.workers or 4)*self.batches_per_worker
+            size = -(-len(x)//batches)
+        batches = [x[start:start+size] for start in xrange(0, len(x), size)]
+        waits = [self.submit(sample_batch, self.f, batch, self.vectorized) for batch in batches]
+        values = [self.wait(batch, wait) for batch, wait in zip(batches, waits)]
+        return np.concatenate(values)
+
+def sample_function(f, N, previous=None):
     """
     Sample a function on N+1 Chebyshev points.
+    previous: optional values of f on the N/2+1 Chebyshev points (N even);
+    these are the even-indexed points of the new grid, so f is only evaluated at the N/2 odd-indexed ones
+    """
+    x = sample_points(N, previous)
+    start = timer() if recorders else None
+    values = f(x)
+    if start is not None:
+        record('sample', len(x), timer() - start)
+    if previous is None:
+        return values
+    return merge_samples(previous, values)
+
+def sample_points(N, previous=None):
+    """
+    The points at which a function is evaluated by `sample_function`.
     """
     x = interpolation_points(N+1)
-    return f(x)
+    if previous is None:
+        return x
+    return x[1::2]
 
-def chebpolyfit(sampled):
+def merge_samples(previous, new):
+    """
+    Interleave the previous values with the new ones, as in `sample_function`.
+    """
+    previous = np.asarray(previous)
+    new = np.asarray(new)
+    sampled = np.empty((len(previous) + len(new),) + new.shape[1:], dtype=np.result_type(previous, new))
+    sampled[::2] = previous
+    sampled[1::2] = new
+    return sampled
+
+def run_threads(target, arguments):
+    """
+    Call target(argument) for each argument, each in its own thread.
+    The first exception raised in a thread is raised again in the calling thread, with its traceback.
+    """
+    errors = []
+    def run(argument):
+        try:
+            target(argument)
+        except Exception:
+            errors.append(sys.exc_info())
+    threads = [threading.Thread(target=run, args=(argument,)) for argument in arguments]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        exc_type, exc_value, exc_traceback = errors[0]
+        # the traceback of the worker thread is kept
+        raise exc_type, exc_value, exc_traceback
+
+@instrumented('chebpolyfit', lambda sampled, workers=None: len(sampled))
+def chebpolyfit(sampled, workers=None):
     """
     Compute Chebyshev coefficients for values located on Chebyshev points.
     sampled: array; first dimension is number of Chebyshev points
+    workers: number of threads among which the columns of vector valued data are transformed
     """
     asampled = np.asarray(sampled)
-    if len(asampled) == 1:
+    N = len(asampled)
+    if N == 1:
         return asampled
-    evened = even_data(asampled)
-    coeffs = dct(evened)
+    if N <= matrix_transform_size:
+        fit, val = transform_matrices(N)
+        return matrix_product(fit, asampled)
+    coeffs = dct1(asampled, workers)/(N-1)
+    coeffs[0] /= 2.
+    coeffs[-1] /= 2.
     return coeffs
 
 import scipy.fftpack as fftpack
@@ -582,6 +1750,8 @@ import scipy.fftpack as fftpack
 def dct(data):
     """
     Compute DCT using FFT
+    Deprecated: no longer used by the library; `chebpolyfit` uses the real DCT-I of `dct1`,
+    which avoids the complex FFT of the even extension built by `even_data`.
     """
     N = len(data)//2
     fftdata     = fftpack.fft(data, axis=0)[:N+1]
@@ -594,44 +1764,172 @@ def dct(data):
         data = fftdata
     return data
 
-def chebpolyval(chebcoeff):
+def dct1(data, workers=None):
+    """
+    Real type-I DCT along the first axis; complex data is transformed by real and imaginary parts.
+    workers: number of threads among which the columns of data are distributed
+    """
+    if np.iscomplexobj(data):
+        return dct1(np.real(data), workers) + 1j*dct1(np.imag(data), workers)
+    data = np.asarray(data, dtype=float)
+    columns = data.reshape(len(data), -1)
+    workers = min(workers or 1, columns.shape[1])
+    if workers <= 1:
+        return fftpack.dct(data, type=1, axis=0)
+    result = np.empty_like(columns)
+    def transform(block):
+        result[:, block] = fftpack.dct(columns[:, block], type=1, axis=0)
+    bounds = np.linspace(0, columns.shape[1], workers+1).astype(int)
+    run_threads(transform, [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])])
+    return result.reshape(data.shape)
+
+# number of points up to which the transforms use dense matrices rather than the DCT
+matrix_transform_size = 65
+
+def transform_matrices(N):
+    """
+    Read-only matrices (fit, val) mapping the values at N Chebyshev points
+    to the Chebyshev coefficients, and back.
+    """
+    return size_cache.get(('transform', N), lambda: _transform_matrices(N))
+
+def _transform_matrices(N):
+    n = N - 1
+    # reduce j*k modulo 2n so that the arguments of the cosine stay small
+    jk = np.outer(np.arange(N), np.arange(N)) % (2*n)
+    val = np.cos(np.pi*jk/n)
+    fit = 2*val.T/n
+    fit[:, [0, -1]] /= 2
+    fit[[0, -1]] /= 2
+    return fit, val
+
+def matrix_product(matrix, data):
+    """
+    Apply a transform matrix along the first axis of data.
+    """
+    if np.ndim(data) <= 2:
+        return np.dot(matrix, data)
+    return np.tensordot(matrix, data, axes=1)
+
+@instrumented('chebpolyval', lambda chebcoeff, workers=None: len(chebcoeff))
+def chebpolyval(chebcoeff, workers=None):
     """
     Compute the interpolation values at Chebyshev points.
     chebcoeff: Chebyshev coefficients
+    workers: number of threads among which the columns of vector valued data are transformed
     """
+    chebcoeff = np.asarray(chebcoeff)
     N = len(chebcoeff)
     if N == 1:
         return chebcoeff
-
-    data = even_data(chebcoeff)/2
+    if N <= matrix_transform_size:
+        fit, val = transform_matrices(N)
+        return matrix_product(val, chebcoeff)
+    data = np.array(chebcoeff, dtype=np.result_type(chebcoeff, float))
     data[0] *= 2
-    data[N-1] *= 2
+    data[-1] *= 2
+    return dct1(data, workers)/2
 
-    fftdata = 2*(N-1)*fftpack.ifft(data, axis=0)
-    complex_values = fftdata[:N]
-    # convert to real if input was real
-    if np.isrealobj(chebcoeff):
-        values = np.real(complex_values)
-    else:
-        values = complex_values
-    return values
+def clenshaw(chebcoeff, x):
+    """
+    Evaluate a Chebyshev series at the points x of [-1, 1] with the Clenshaw recurrence.
+    chebcoeff: Chebyshev coefficients, possibly vector valued (shape (N, ...))
+    The result has shape x.shape + chebcoeff.shape[1:].
+    """
+    chebcoeff = np.asarray(chebcoeff)
+    x = np.asarray(x, dtype=float)
+    t = x.reshape(x.shape + (1,)*(chebcoeff.ndim - 1))
+    shape = x.shape + chebcoeff.shape[1:]
+    dtype = np.result_type(chebcoeff, float)
+    b1 = np.zeros(shape, dtype=dtype)
+    b2 = np.zeros(shape, dtype=dtype)
+    if len(chebcoeff) == 1:
+        return b1 + chebcoeff[0]
+    t2 = 2*t
+    for c in chebcoeff[:0:-1]:
+        b1, b2 = c + t2*b1 - b2, b1
+    return chebcoeff[0] + t*b1 - b2
+
+def pad_coefficients(chebcoeff, N):
+    """
+    Pad Chebyshev coefficients with zeros up to length N.
+    """
+    coeffs = np.asarray(chebcoeff)
+    padded = np.zeros((N,) + coeffs.shape[1:], dtype=coeffs.dtype)
+    padded[:len(coeffs)] = coeffs
+    return padded
 
 def interpolator(x, values):
     """
     Returns a polynomial with vector coefficients which interpolates the values at the Chebyshev points x
     """
-    # hacking the barycentric interpolator by computing the weights in advance
-    p = Bary([0.])
-    N = len(values)
-    weights = np.ones(N)
-    weights[0] = .5
-    weights[1::2] = -1
-    weights[-1] *= .5
-    p.wi = weights
+    # hacking the barycentric interpolator: only its base class is initialised,
+    # since its own constructor computes the weights, which are cached instead
+    p = Bary.__new__(Bary)
+    super(Bary, p).__init__(axis=0)
+    p.wi = barycentric_weights(len(values))
     p.xi = x
     p.set_yi(values)
     return p
 
+# ----------------------------------------------------------------
+# Helpers for root finding.
+# ----------------------------------------------------------------
+
+def chebroots(chebcoeff):
+    """
+    Roots in the complex plane of a Chebyshev series, computed as the eigenvalues of its colleague matrix.
+    """
+    if len(chebcoeff) < 2:
+        return np.array([], dtype=complex)
+    return np.linalg.eigvals(poly.chebyshev.chebcompanion(chebcoeff))
+
+def bernstein_parameter(z):
+    """
+    Parameter rho >= 1 of the Bernstein ellipse (with foci -1 and 1) passing through z.
+    """
+    z = np.asarray(z, dtype=complex)
+    w = np.abs(z + np.sqrt(z-1)*np.sqrt(z+1))
+    return np.maximum(w, 1/w)
+
+def restrict_coefficients(chebcoeff, a, b):
+    """
+    Chebyshev coefficients, on [a, b], of a Chebyshev series defined on [-1, 1].
+    """
+    x = to_domain(interpolation_points(len(chebcoeff)), (a, b))
+    # chebval puts the components of vector coefficients first
+    return chebpolyfit(poly.chebyshev.chebval(x, chebcoeff).T)
+
+# slightly off centre, so as not to split exactly at a root of a symmetric function
+split_point = -0.004849834917525
+
+def real_roots(chebcoeff, scale, max_size, depth=0):
+    """
+    Sorted real roots in [-1, 1] of a Chebyshev series.
+    Series longer than max_size are split into two halves, whose roots are computed recursively.
+    scale: the scale of the coefficients, used to prune negligible coefficients
+    """
+    bnd = emach*scale*max(128, len(chebcoeff))
+    significant = np.nonzero(np.abs(chebcoeff) >= bnd)[0]
+    if not len(significant):
+        return np.array([])
+    coeffs = chebcoeff[:significant[-1]+1]
+    tol = 10*np.sqrt(emach)
+    if len(coeffs) <= max_size or depth >= 40:
+        roots = chebroots(coeffs)
+        real = roots[(np.abs(np.imag(roots)) < tol) & (np.abs(np.real(roots)) <= 1 + tol)]
+        roots = np.sort(np.clip(np.real(real), -1., 1.))
+    else:
+        halves = []
+        for a, b in [(-1., split_point), (split_point, 1.)]:
+            local = real_roots(restrict_coefficients(coeffs, a, b), scale, max_size, depth+1)
+            halves.append(to_domain(local, (a, b)))
+        roots = np.concatenate(halves)
+    # remove duplicates, for instance at the split point
+    keep = np.ones(len(roots), dtype=bool)
+    keep[1:] = np.diff(roots) > tol
+    return roots[keep]
+
 # ----------------------------------------------------------------
 # Helper for differentiation.
 # ----------------------------------------------------------------
@@ -649,11 +1947,59 @@ def differentiator(A):
         return np.zeros_like(A[0:1])
     if m == 2: # linear
         return A[1:2,]
-    DA[m-3:m-1,] = SA[m-2:m,]
-    for j in range(m//2 - 1):
-        k = m-3-2*j
-        DA[k] = SA[k+1] + DA[k+2]
-        DA[k-1] = SA[k] + DA[k+1]
-    DA[0] = (SA[1] + DA[2])*0.5
+    # DA[k] is the sum of SA[j] for j > k with j - k odd:
+    # reverse cumulative sums of the even and odd coefficients, for all the columns at once
+    tails = np.empty_like(SA)
+    tails[::2] = np.cumsum(SA[::2][::-1], axis=0)[::-1]
+    tails[1::2] = np.cumsum(SA[1::2][::-1], axis=0)[::-1]
+    DA[:m-1] = tails[1:]
+    DA[0] *= 0.5
     return DA
 
+def chebdiff(chebcoeff, n=1):
+    """
+    Chebyshev coefficients of the n-th derivative on [-1, 1], possibly vector valued.
+    The result has max(N-n, 1) coefficients.
+    """
+    coeffs = np.asarray(chebcoeff)
+    for _ in range(n):
+        coeffs = differentiator(coeffs)[:max(len(coeffs)-1, 1)]
+    return coeffs
+
+# largest number of coefficients for which the differentiation matrices are cached;
+# they have about N**2/4 nonzero entries, and count towards the bytes held by `size_cache`
+differentiation_cache_size = 1024
+
+def differentiation_matrix(N, n=1):
+    """
+    Sparse matrix of shape (max(N-n, 1), N) mapping N Chebyshev coefficients to those of the n-th derivative on [-1, 1].
+    It is upper triangular, with nonzero entries only where the column and row indices differ by n modulo 2.
+    The matrices are cached by size, up to `differentiation_cache_size`, within the memory bound of `size_cache`.
+    """
+    def compute():
+        matrix = first_differentiation_matrix(N)
+        for _ in range(n-1):
+            matrix = first_differentiation_matrix(matrix.shape[0]).dot(matrix)
+        for array in (matrix.data, matrix.indices, matrix.indptr):
+            array.flags.writeable = False
+        return matrix
+    if N > differentiation_cache_size:
+        return compute()
+    return size_cache.get(('differentiation', N, n), compute)
+
+def first_differentiation_matrix(N):
+    """
+    Sparse matrix of the first derivative, built from its pattern:
+    the entry (i, j) is 2j for j > i with j - i odd, halved in the first row.
+    """
+    if N == 1:
+        return sparse.csr_matrix((1, 1))
+    rows = np.arange(N-1)
+    counts = (N - rows)//2
+    indptr = np.concatenate([[0], np.cumsum(counts)])
+    starts = np.repeat(indptr[:-1], counts)
+    indices = np.repeat(rows + 1, counts) + 2*(np.arange(indptr[-1]) - starts)
+    data = 2.*indices
+    data[:counts[0]] *= .5
+    return sparse.csr_matrix((data, indices, indptr), shape=(N-1, N))
+
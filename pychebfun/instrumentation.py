@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# coding: UTF-8
+"""
+Instrumentation
+===============
+
+Opt-in counters of the work done in the hot paths.
+
+Each instrumented step records an event with a size and a duration in seconds:
+
+- ``sample``: evaluation of the sampled function; the size is the number of points
+- ``dichotomy_level``: one level of a dichotomy; the size is the number of points of the level
+- ``dichotomy``: a whole dichotomy; the size is the number of coefficients found
+- ``no_convergence``: a dichotomy which reached kmax without converging
+- ``chebpolyfit``, ``chebpolyval``: transforms; the size is the number of values
+- ``evaluate.barycentric``, ``evaluate.clenshaw``: evaluation of a block of points; the size is the number of points
+
+The events are sent to the recorders, which are callables ``recorder(event, size, duration)``, such as `Counters`.
+Recorders are process-wide; when there are none, the cost of the instrumentation is a test of an empty list.
+"""
+from __future__ import division
+
+import threading
+from timeit import default_timer as timer
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+# the current recorders; modified in place only
+recorders = []
+
+def record(event, size=1, duration=0.):
+    """
+    Send an event to the recorders.
+    """
+    for recorder in list(recorders):
+        recorder(event, size, duration)
+
+def add_recorder(recorder):
+    """
+    Send all the subsequent events to recorder(event, size, duration).
+    """
+    recorders.append(recorder)
+
+def remove_recorder(recorder):
+    recorders.remove(recorder)
+
+def instrumented(event, size):
+    """
+    Decorator recording the event, with size(*args, **kwargs) and the duration of each call,
+    when there are recorders.
+    """
+    def decorator(fun):
+        @wraps(fun)
+        def wrapper(*args, **kwargs):
+            if not recorders:
+                return fun(*args, **kwargs)
+            start = timer()
+            result = fun(*args, **kwargs)
+            record(event, size(*args, **kwargs), timer() - start)
+            return result
+        return wrapper
+    return decorator
+
+class Counters(object):
+    """
+    Recorder accumulating, for each event, the number of occurrences, the total size, the last size and the total duration.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = defaultdict(int)
+        self.sizes = defaultdict(int)
+        self.last = {}
+        self.times = defaultdict(float)
+
+    def __call__(self, event, size=1, duration=0.):
+        with self._lock:
+            self.counts[event] += 1
+            self.sizes[event] += size
+            self.last[event] = size
+            self.times[event] += duration
+
+    def __repr__(self):
+        return "<Counters({0})>".format(dict(self.counts))
+
+    def report(self):
+        """
+        Table of the counters, one event per line.
+        """
+        lines = ["{0:22s} {1:>8s} {2:>12s} {3:>10s} {4:>12s}".format('event', 'count', 'size', 'last', 'time (s)')]
+        for event in sorted(self.counts):
+            lines.append("{0:22s} {1:8d} {2:12d} {3:10d} {4:12.6f}".format(event, self.counts[event], self.sizes[event], self.last[event], self.times[event]))
+        return '\n'.join(lines)
+
+@contextmanager
+def instrumentation(callback=None):
+    """
+    Context manager recording the events within the block in the `Counters` it returns:
+
+        with instrumentation() as counters:
+            chebfun(f)
+        print(counters.report())
+
+    callback: optional recorder also receiving the events
+    """
+    counters = Counters()
+    added = [counters] + ([callback] if callback is not None else [])
+    for recorder in added:
+        add_recorder(recorder)
+    try:
+        yield counters
+    finally:
+        for recorder in added:
+            remove_recorder(recorder)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# coding: UTF-8
+"""
+Libraries of chebfuns
+=====================
+
+Large collections of chebfuns stored on disk, indexed by a string key.
+
+A library is a directory with the files:
+
+- ``library.json``: the header (dtype of the coefficients and format version)
+- ``coefficients.bin``: the Chebyshev coefficients of all the chebfuns, one block after the other
+- ``entries.bin``: one fixed-width record per chebfun (see `entry_dtype`), in the order in which they were added
+- ``keys.bin``: the UTF-8 encoded keys, one after the other
+- ``buckets.bin``: an open addressing hash table from the hashes of the keys to the records
+
+All the binary files are opened with ``np.memmap``, so opening a library reads its header only,
+and loading a chebfun only reads its record, its key and its own block of coefficients.
+"""
+from __future__ import division
+
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from .chebfun import Chebfun
+
+# maximal number of dimensions of the coefficients of a stored chebfun
+max_ndim = 4
+
+# record describing a stored chebfun
+entry_dtype = np.dtype([
+    ('hash', '<u8'), # hash of the key
+    ('key_offset', '<i8'), # position and length of the key in keys.bin
+    ('key_length', '<i8'),
+    ('offset', '<i8'), # position of the coefficients in coefficients.bin, in units of the library dtype
+    ('ndim', '<i8'),
+    ('shape', '<i8', (max_ndim,)),
+    ('domain', '<f8', (2,)),
+    ('scale', '<f8'),
+    ])
+
+bucket_dtype = np.dtype('<i8')
+
+def key_hash(key):
+    """
+    Hash of an encoded key, independent of the interpreter.
+    """
+    return int(hashlib.md5(key).hexdigest()[:16], 16)
+
+def encode_key(key):
+    if isinstance(key, bytes):
+        return key
+    return key.encode('utf-8')
+
+class ChebfunLibrary(object):
+    """
+    On-disk store of chebfuns, indexed by string keys.
+    mode: 'r' to read, 'a' to read and append (the library is created if needed), 'w' to create a new, empty library
+    """
+
+    version = 2
+
+    header_file = 'library.json'
+    coefficients_file = 'coefficients.bin'
+    entries_file = 'entries.bin'
+    keys_file = 'keys.bin'
+    buckets_file = 'buckets.bin'
+
+    # number of buckets of a new library; the table is doubled when it is half full
+    initial_buckets = 8
+
+    def __init__(self, path, mode='r', dtype=float):
+        """
+        path: directory of the library
+        dtype: dtype of the coefficients, for a new library
+        """
+        if mode not in ('r', 'a', 'w'):
+            raise ValueError("Mode should be 'r', 'a' or 'w'")
+        self.path = path
+        self.mode = mode
+        self._maps = {}
+        exists = os.path.exists(self._path(self.header_file))
+        create = mode == 'w' or (mode == 'a' and not exists)
+        if create:
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            self.dtype = np.dtype(dtype)
+            with open(self._path(self.header_file), 'w') as header:
+                header.write(json.dumps({'dtype': self.dtype.str, 'version': self.version}) + '\n')
+            for name in [self.coefficients_file, self.entries_file, self.keys_file]:
+                open(self._path(name), 'wb').close()
+        else:
+            self._read_header()
+        self._size = os.path.getsize(self._path(self.coefficients_file)) // self.dtype.itemsize
+        self._length = os.path.getsize(self._path(self.entries_file)) // entry_dtype.itemsize
+        self._key_size = os.path.getsize(self._path(self.keys_file))
+        if create:
+            self._write_buckets(np.empty(self.initial_buckets, dtype=bucket_dtype))
+        self._open_buckets()
+
+    def _path(self, name):
+        return os.path.join(self.path, name)
+
+    def _read_header(self):
+        """
+        Read the header; neither the entries nor the coefficients are read.
+        """
+        with open(self._path(self.header_file)) as header_file:
+            header = json.loads(header_file.read())
+        if header['version'] != self.version:
+            raise ValueError("Unsupported library version {0}".format(header['version']))
+        self.dtype = np.dtype(str(header['dtype']))
+
+    def _mapped(self, name, dtype, count):
+        """
+        The first `count` items of the file `name`, mapped read-only in memory.
+        The file is mapped again when it has grown.
+        """
+        data = self._maps.get(name)
+        if data is None or len(data) < count:
+            if count:
+                data = np.memmap(self._path(name), dtype=dtype, mode='r', shape=(count,))
+            else:
+                data = np.empty(0, dtype=dtype)
+            self._maps[name] = data
+        return data
+
+    def _memmap(self):
+        """
+        The coefficients of the whole library, mapped read-only in memory.
+        """
+        return self._mapped(self.coefficients_file, self.dtype, self._size)
+
+    def _entries(self):
+        """
+        The records of the whole library, mapped read-only in memory.
+        """
+        return self._mapped(self.entries_file, entry_dtype, self._length)
+
+    def _encoded_key(self, index):
+        entry = self._entries()[index]
+        start = entry['key_offset']
+        keys = self._mapped(self.keys_file, np.uint8, self._key_size)
+        return keys[start:start+entry['key_length']].tostring()
+
+    def _open_buckets(self):
+        mode = 'r' if self.mode == 'r' else 'r+'
+        self._buckets = np.memmap(self._path(self.buckets_file), dtype=bucket_dtype, mode=mode)
+
+    def _write_buckets(self, buckets):
+        """
+        Fill the hash table `buckets` with all the entries, and write it to disk.
+        The file is replaced rather than overwritten, so that libraries opened before keep a valid table.
+        """
+        buckets[:] = -1
+        for index, h in enumerate(self._entries()['hash']):
+            insert_bucket(buckets, int(h), index)
+        temporary = self._path(self.buckets_file + '.new')
+        buckets.tofile(temporary)
+        os.rename(temporary, self._path(self.buckets_file))
+
+    def _find(self, key):
+        """
+        The index of the entry of `key`, or None if it is not in the library.
+        """
+        encoded = encode_key(key)
+        h = key_hash(encoded)
+        entries = self._entries()
+        mask = len(self._buckets) - 1
+        slot = h & mask
+        while True:
+            index = self._buckets[slot]
+            if index < 0:
+                return None
+            # entries appended since the library was opened are ignored
+            if index < len(entries) and entries['hash'][index] == h and self._encoded_key(index) == encoded:
+                return index
+            slot = (slot + 1) & mask
+
+    def _entry(self, key):
+        index = self._find(key)
+        if index is None:
+            raise KeyError(key)
+        return self._entries()[index]
+
+    def __repr__(self):
+        return "<ChebfunLibrary({0}, {1})>".format(self.path, len(self))
+
+    def __len__(self):
+        return self._length
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self._encoded_key(index).decode('utf-8')
+
+    def keys(self):
+        """
+        The keys, in the order in which the chebfuns were added.
+        """
+        return list(self)
+
+    def coefficients(self, key):
+        """
+        The Chebyshev coefficients of the chebfun `key`, as a read-only view of the memory-mapped file.
+        """
+        return self._coefficients(self._entry(key))
+
+    def _coefficients(self, entry):
+        shape = tuple(entry['shape'][:entry['ndim']])
+        size = int(np.prod(shape))
+        offset = entry['offset']
+        return np.asarray(self._memmap()[offset:offset+size]).reshape(shape)
+
+    def __getitem__(self, key):
+        """
+        The chebfun stored under `key`.
+        """
+        entry = self._entry(key)
+        # the values are only computed if the chebfun is evaluated
+        return Chebfun._from_coefficients(self._coefficients(entry), float(entry['scale']), list(entry['domain']))
+
+    def append(self, key, chebfun):
+        """
+        Store a chebfun under a new key.
+        """
+        if self.mode == 'r':
+            raise IOError("Library opened in read-only mode")
+        if key in self:
+            raise KeyError("Key {0} already in the library".format(key))
+        coeffs = chebfun.chebyshev_coefficients()
+        if not np.can_cast(coeffs.dtype, self.dtype):
+            raise TypeError("Cannot store coefficients of type {0} in a library of type {1}".format(coeffs.dtype, self.dtype))
+        if coeffs.ndim > max_ndim:
+            raise ValueError("Cannot store coefficients with more than {0} dimensions".format(max_ndim))
+        data = np.ascontiguousarray(coeffs, dtype=self.dtype)
+        encoded = encode_key(key)
+        entry = np.zeros(1, dtype=entry_dtype)
+        entry['hash'] = key_hash(encoded)
+        entry['key_offset'] = self._key_size
+        entry['key_length'] = len(encoded)
+        entry['offset'] = self._size
+        entry['ndim'] = data.ndim
+        entry['shape'][0, :data.ndim] = data.shape
+        entry['domain'] = chebfun.domain()
+        entry['scale'] = chebfun._scale
+        with open(self._path(self.coefficients_file), 'ab') as coefficients:
+            coefficients.write(data.tostring())
+        with open(self._path(self.keys_file), 'ab') as keys:
+            keys.write(encoded)
+        with open(self._path(self.entries_file), 'ab') as entries:
+            entries.write(entry.tostring())
+        self._size += data.size
+        self._key_size += len(encoded)
+        self._length += 1
+        if 2*self._length > len(self._buckets):
+            # the new entry is inserted with the others
+            buckets = np.empty(2*len(self._buckets), dtype=bucket_dtype)
+            self._buckets = None
+            self._write_buckets(buckets)
+            self._open_buckets()
+        else:
+            insert_bucket(self._buckets, int(entry['hash'][0]), self._length - 1)
+
+    __setitem__ = append
+
+    def update(self, chebfuns):
+        """
+        Store several chebfuns, given as a dictionary or a sequence of (key, chebfun) pairs.
+        """
+        if isinstance(chebfuns, dict):
+            chebfuns = chebfuns.items()
+        for key, chebfun in chebfuns:
+            self.append(key, chebfun)
+
+def insert_bucket(buckets, h, index):
+    """
+    Store the entry `index`, whose key has hash h, in the first free bucket from h on.
+    """
+    mask = len(buckets) - 1
+    slot = h & mask
+    while buckets[slot] >= 0:
+        slot = (slot + 1) & mask
+    buckets[slot] = index
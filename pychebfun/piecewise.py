@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# coding: UTF-8
+"""
+Piecewise chebfuns
+==================
+
+Functions represented by one Chebfun on each interval between breakpoints.
+Non-smooth functions are split automatically at the singularities found by edge detection.
+"""
+from __future__ import division
+
+import numpy as np
+
+from .chebfun import Chebfun, cast_scalar, coefficient_scale, emach, operand_types
+
+def detect_edge(f, a, b, n=50, max_order=4):
+    """
+    Locate a singularity of f in [a, b].
+    The order of the singularity is the lowest order of finite differences that grows under refinement;
+    the differences of that order are then followed by zooming in, down to machine precision.
+    Return a bracket (left, right) of the singularity, or None if no singularity was found.
+    """
+    x1 = np.linspace(a, b, n)
+    x2 = np.linspace(a, b, 2*n-1)
+    y1 = f(x1)
+    y2 = f(x2)
+    h1 = x1[1] - x1[0]
+    h2 = x2[1] - x2[0]
+    for order in range(1, max_order+1):
+        d1 = np.max(np.abs(np.diff(y1, order)))/h1**order
+        d2 = np.max(np.abs(np.diff(y2, order)))/h2**order
+        if d2 > 1.5*d1:
+            break
+    else:
+        return None
+    left, right = a, b
+    while right - left > 4*emach*max(abs(left), abs(right), 1.):
+        x = np.linspace(left, right, n)
+        i = np.argmax(np.abs(np.diff(f(x), order)))
+        if (x[i], x[i+order]) == (left, right):
+            break
+        left, right = x[i], x[i+order]
+    return left, right
+
+class PiecewiseChebfun(object):
+    """
+    Piecewise polynomial: the i-th piece is a Chebfun on the domain [breakpoints[i], breakpoints[i+1]].
+    """
+
+    NoConvergence = Chebfun.NoConvergence
+
+    # log2 of the largest number of interpolation points per piece before splitting
+    piece_kmax = 8
+
+    # relative width below which a piece is no longer split
+    min_width = 1e-14
+
+    @classmethod
+    def from_function(self, f, breakpoints=(-1., 1.), splitting=True):
+        """
+        Initialise from a function to sample on each interval between the breakpoints.
+        splitting: whether to split further the pieces which do not converge
+        """
+        breakpoints = np.asarray(breakpoints, dtype=float)
+        hscale = max(np.max(np.abs(breakpoints)), 1.)
+        pieces = []
+        ends = [breakpoints[0]]
+        for a, b in zip(breakpoints[:-1], breakpoints[1:]):
+            if splitting:
+                new_pieces, new_ends = self._split(f, a, b, self.min_width*hscale)
+            else:
+                new_pieces, new_ends = [Chebfun.from_function(f, domain=(a, b))], [b]
+            pieces.extend(new_pieces)
+            ends.extend(new_ends)
+        return self(pieces, ends)
+
+    @classmethod
+    def _split(self, f, a, b, min_width, depth=0):
+        """
+        Pieces and right endpoints representing f on [a, b], split where the coefficients do not decay.
+        """
+        if b - a <= min_width:
+            return [Chebfun.from_function(f, N=2, domain=(a, b))], [b]
+        try:
+            coeffs = Chebfun.dichotomy(f, kmax=self.piece_kmax, domain=(a, b))
+        except Chebfun.NoConvergence:
+            if depth > 50:
+                raise
+        else:
+            return [Chebfun.from_chebcoeff(coeffs, scale=coefficient_scale(coeffs), domain=(a, b), chop=Chebfun.chop)], [b]
+        bracket = detect_edge(f, a, b)
+        if bracket is None:
+            ends = [(a+b)/2]
+        else:
+            left, right = bracket
+            if right - left > min_width:
+                ends = [(left+right)/2]
+            else:
+                # isolate the singularity in a sliver
+                ends = [e for e in bracket if a < e < b]
+        pieces = []
+        new_ends = []
+        for left, right in zip([a] + ends, ends + [b]):
+            p, e = self._split(f, left, right, min_width, depth+1)
+            pieces.extend(p)
+            new_ends.extend(e)
+        return pieces, new_ends
+
+    @classmethod
+    def from_chebfun(self, chebfun):
+        """
+        A single piece on the domain of the chebfun.
+        """
+        return self([chebfun], chebfun.domain())
+
+    def __init__(self, pieces, breakpoints):
+        """
+        pieces: list of n Chebfun
+        breakpoints: n+1 increasing points
+        """
+        self.pieces = list(pieces)
+        self._breakpoints = np.asarray(breakpoints, dtype=float)
+        if len(self._breakpoints) != len(self.pieces) + 1:
+            raise ValueError("There should be one more breakpoint than pieces")
+
+    def __repr__(self):
+        return "<PiecewiseChebfun({0})>".format(list(self._breakpoints))
+
+    def breakpoints(self):
+        return self._breakpoints
+
+    def domain(self):
+        return self._breakpoints[[0, -1]]
+
+    def intervals(self):
+        return zip(self._breakpoints[:-1], self._breakpoints[1:])
+
+    def size(self):
+        """
+        Total number of interpolation points.
+        """
+        return sum(p.size() for p in self.pieces)
+
+    def __call__(self, x):
+        """
+        Evaluate at x; a point on a breakpoint is evaluated by the piece on its right.
+        """
+        x = np.asarray(x, dtype=float)
+        flat = x.ravel()
+        indices = np.searchsorted(self._breakpoints[1:-1], flat, side='right')
+        results = [None]*len(self.pieces)
+        for i, piece in enumerate(self.pieces):
+            mask = indices == i
+            if np.any(mask):
+                results[i] = (mask, piece(flat[mask]))
+        shape = self.pieces[0].values().shape[1:]
+        dtype = np.result_type(*[p.values() for p in self.pieces])
+        out = np.empty((len(flat),) + shape, dtype=dtype)
+        for result in results:
+            if result is not None:
+                mask, values = result
+                out[mask] = values
+        return out.reshape(x.shape + shape)
+
+    def sum(self):
+        """
+        Integral over the whole interval.
+        """
+        return np.sum([p.sum() for p in self.pieces], axis=0)
+
+    def roots(self):
+        """
+        Sorted roots on all the pieces.
+        """
+        roots = np.sort(np.concatenate([p.roots() for p in self.pieces]))
+        # a root on a breakpoint is found on both sides
+        keep = np.ones(len(roots), dtype=bool)
+        keep[1:] = np.diff(roots) > 10*np.sqrt(emach)*max(np.max(np.abs(self._breakpoints)), 1.)
+        return roots[keep]
+
+    def restrict(self, breakpoints):
+        """
+        The pieces on finer breakpoints, which must include the current ones.
+        """
+        pieces = []
+        for c, d in zip(breakpoints[:-1], breakpoints[1:]):
+            i = np.searchsorted(self._breakpoints[1:-1], (c+d)/2, side='right')
+            piece = self.pieces[i]
+            if (c, d) != tuple(piece.domain()):
+                piece = piece.restrict((c, d))
+            pieces.append(piece)
+        return PiecewiseChebfun(pieces, breakpoints)
+
+    def _combine(self, other, op):
+        """
+        Apply the binary operation op piece by piece, on the union of the breakpoints.
+        """
+        if isinstance(other, Chebfun):
+            other = self.from_chebfun(other)
+        if not np.array_equal(self.domain(), other.domain()):
+            raise Chebfun.DomainMismatch(self.domain(), other.domain())
+        breakpoints = np.union1d(self._breakpoints, other._breakpoints[1:-1])
+        left = self.restrict(breakpoints).pieces
+        right = other.restrict(breakpoints).pieces
+        return PiecewiseChebfun([op(p, q) for p, q in zip(left, right)], breakpoints)
+
+    @cast_scalar
+    def __add__(self, other):
+        return self._combine(other, lambda p, q: p + q)
+
+    __radd__ = __add__
+
+    @cast_scalar
+    def __sub__(self, other):
+        return self._combine(other, lambda p, q: p - q)
+
+    def __rsub__(self, other):
+        return -(self - other)
+
+    @cast_scalar
+    def __mul__(self, other):
+        return self._combine(other, lambda p, q: p * q)
+
+    __rmul__ = __mul__
+
+    @cast_scalar
+    def __div__(self, other):
+        return self._combine(other, lambda p, q: p / q)
+
+    __truediv__ = __div__
+
+    @cast_scalar
+    def __rdiv__(self, other):
+        return self._combine(other, lambda p, q: q / p)
+
+    __rtruediv__ = __rdiv__
+
+    def __neg__(self):
+        return PiecewiseChebfun([-p for p in self.pieces], self._breakpoints)
+
+operand_types.append(PiecewiseChebfun)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# coding: UTF-8
+from __future__ import division
+
+import os
+
+import sys
+testdir = os.path.dirname(__file__)
+moduledir = os.path.join(testdir, os.path.pardir)
+sys.path.insert(0, moduledir)
+from pychebfun import *
+
+import numpy as np
+np.seterr(all='raise')
+import numpy.testing as npt
+
+import unittest
+
+xs = np.linspace(-1, 1, 1000)
+
+def sines(x, m=20):
+    return np.sin(np.outer(x, np.arange(1, m+1)))
+
+class TestChebfunArray(unittest.TestCase):
+    def setUp(self):
+        self.a = ChebfunArray.from_function(sines)
+
+    def test_len(self):
+        self.assertEqual(len(self.a), 20)
+
+    def test_eval(self):
+        npt.assert_allclose(self.a(xs), sines(xs), atol=1e-13)
+
+    def test_sizes(self):
+        """
+        Each column is chopped separately.
+        """
+        sizes = self.a.sizes()
+        self.assertLess(sizes[0], sizes[-1])
+        for i in [0, 9, 19]:
+            self.assertEqual(sizes[i], Chebfun.from_function(lambda x: np.sin((i+1)*x)).size())
+
+    def test_tolerance(self):
+        a = ChebfunArray.from_function(sines, tol=1e-8)
+        self.assertTrue(np.all(a.sizes() <= self.a.sizes()))
+        self.assertLess(a.sizes()[-1], self.a.sizes()[-1])
+        npt.assert_allclose(a(xs), sines(xs), atol=1e-7)
+        small = ChebfunArray.from_function(lambda x: 1e-6*sines(x), tol=1e-8)
+        npt.assert_array_equal(small.sizes(), a.sizes())
+
+    def test_getitem(self):
+        c = self.a[4]
+        self.assertIsInstance(c, Chebfun)
+        npt.assert_allclose(c(xs), np.sin(5*xs), atol=1e-13)
+
+    def test_sum(self):
+        k = np.arange(1, 21)
+        npt.assert_allclose(ChebfunArray.from_function(lambda x: np.cos(np.outer(x, k))).sum(), 2*np.sin(k)/k, atol=1e-13)
+
+    def test_differentiate(self):
+        d = self.a.differentiate()
+        k = np.arange(1, 21)
+        npt.assert_allclose(d(xs), k*np.cos(np.outer(xs, k)), atol=1e-11)
+
+    def test_gram(self):
+        """
+        sin(kx) are orthogonal on [-pi, pi].
+        """
+        k = np.arange(1, 11)
+        a = ChebfunArray.from_function(lambda x: np.sin(np.outer(x, k)), domain=[-np.pi, np.pi])
+        npt.assert_allclose(a.gram(), np.pi*np.eye(10), atol=1e-12)
+        chebfuns = [Chebfun.from_function(np.sin), Chebfun.from_function(np.exp), Chebfun.identity()]
+        expected = [[p.dot(q) for q in chebfuns] for p in chebfuns]
+        npt.assert_allclose(gram(chebfuns), expected)
+
+    def test_gram_large(self):
+        """
+        Above the dense size, the product weights are applied by FFT.
+        """
+        rng = np.random.RandomState(0)
+        coeffs = rng.randn(300, 3)/np.arange(1, 301)[:, np.newaxis]
+        a = ChebfunArray.from_chebcoeff(coeffs, prune=False)
+        expected = np.dot(coeffs.T, np.dot(product_weights(300), coeffs))
+        npt.assert_allclose(a.gram(), expected, atol=1e-13)
+
+    def test_from_functions(self):
+        fs = [np.sin, np.cos, np.exp]
+        a = ChebfunArray.from_functions(fs)
+        npt.assert_allclose(a(.3), [np.sin(.3), np.cos(.3), np.exp(.3)])
+
+    def test_from_chebfuns(self):
+        cs = [Chebfun.from_function(np.sin), Chebfun.from_function(np.exp), Chebfun(1.)]
+        a = ChebfunArray.from_chebfuns(cs)
+        npt.assert_allclose(a(xs), np.column_stack([c(xs) for c in cs]))
+        npt.assert_allclose(a.sum(), [c.sum() for c in cs])
+
+    def test_no_convergence(self):
+        with self.assertRaises(ChebfunArray.NoConvergence):
+            ChebfunArray.from_functions([np.sin, np.sign])
+
+    def test_domain(self):
+        a = ChebfunArray.from_functions([np.sin, np.exp], domain=[0, 3])
+        ys = np.linspace(0, 3)
+        npt.assert_allclose(a(ys), np.column_stack([np.sin(ys), np.exp(ys)]), atol=1e-13)
+        npt.assert_allclose(a.sum(), [1 - np.cos(3), np.exp(3) - 1])
+        npt.assert_allclose(a.differentiate()(ys), np.column_stack([np.cos(ys), np.exp(ys)]), atol=1e-12)
+        npt.assert_allclose(a[1].domain(), [0, 3])
+
+    def test_domain_mismatch(self):
+        cs = [Chebfun.from_function(np.sin), Chebfun.from_function(np.sin, domain=[0, 1])]
+        with self.assertRaises(Chebfun.DomainMismatch):
+            ChebfunArray.from_chebfuns(cs)
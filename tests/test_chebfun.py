@@ -15,6 +15,9 @@ np.seterr(all='raise')
 import numpy.testing as npt
 
 import unittest
+import operator
+import traceback
+import weakref
 
 def Identity(x):
     return x
@@ -210,6 +213,141 @@ class Test_sinsinexp(unittest.TestCase):
         """
         assert_equal(self.p, Chebfun.from_function(self.p))
 
+class Test_sinsinexp_threshold(Test_sinsinexp):
+    """
+    Same tests with the threshold chopping rule.
+    """
+    def setUp(self):
+        self.chop = Chebfun.chop
+        Chebfun.chop = 'threshold'
+        self.p = Chebfun.from_function(f)
+
+    def tearDown(self):
+        Chebfun.chop = self.chop
+
+class TestChop(unittest.TestCase):
+    def test_noisy(self):
+        """
+        The plateau rule stops at the noise level.
+        """
+        rng = np.random.RandomState(0)
+        def noisy(x):
+            return np.exp(x) + 1e-12*rng.randn(*np.shape(x))
+        plateau = Chebfun.from_function(noisy)
+        self.assertLess(plateau.size(), 20)
+        npt.assert_allclose(plateau(xs), np.exp(xs), atol=1e-11)
+        with self.assertRaises(Chebfun.NoConvergence):
+            Chebfun.from_function(noisy, chop='threshold')
+
+    def test_cutoff(self):
+        self.assertEqual(plateau_cutoff(np.zeros(20)), 1)
+        # no plateau
+        self.assertIsNone(plateau_cutoff(2.**-np.arange(20)))
+        # geometric decay down to 2e-12, then a plateau
+        coeffs = np.hstack([2.**-np.arange(40), 1e-14*np.ones(40)])
+        N = plateau_cutoff(coeffs)
+        self.assertEqual(N, 40)
+        self.assertEqual(plateau_cutoff(np.column_stack([coeffs, coeffs/2])), N)
+        # each column separately: 0 where there is no plateau
+        columns = np.column_stack([coeffs, 1.2**-np.arange(80), np.zeros(80)])
+        npt.assert_array_equal(plateau_cutoffs(columns), [40, 0, 1])
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            Chebfun.from_function(f, chop='magic')
+
+class TestTolerance(unittest.TestCase):
+    def test_degree(self):
+        """
+        A looser tolerance needs fewer coefficients, and is met.
+        """
+        for chop in ['plateau', 'threshold']:
+            default = Chebfun.from_function(f, chop=chop)
+            loose = Chebfun.from_function(f, chop=chop, tol=1e-8)
+            self.assertLess(loose.size(), default.size())
+            npt.assert_allclose(loose(xs), f(xs), atol=1e-7)
+
+    def test_chebfun(self):
+        self.assertEqual(chebfun(f, tol=1e-8).size(), Chebfun.from_function(f, tol=1e-8).size())
+        coeffs = 10.**-np.arange(16)
+        self.assertEqual(chebfun(chebcoeff=coeffs, tol=1e-8).size(), 9)
+        self.assertEqual(Chebfun.from_chebcoeff(1e-6*coeffs, scale=1e-6, tol=1e-8).size(), 9)
+        self.assertEqual(Chebfun.from_chebcoeff(1e-6*coeffs, scale=coefficient_scale(1e-6*coeffs), tol=1e-8).size(), 9)
+        # the tolerance does not change the scale
+        small = 1e-10*np.random.rand(10)
+        self.assertEqual(Chebfun.from_chebcoeff(small, tol=128*emach).size(), Chebfun.from_chebcoeff(small).size())
+
+    def test_relative(self):
+        """
+        The tolerance is relative to the magnitude of the function.
+        """
+        for chop in ['plateau', 'threshold']:
+            unit = Chebfun.from_function(np.exp, chop=chop, tol=1e-8)
+            for magnitude in [1e-6, 1e6]:
+                c = Chebfun.from_function(lambda x: magnitude*np.exp(x), chop=chop, tol=1e-8)
+                self.assertEqual(c.size(), unit.size())
+                npt.assert_allclose(c(xs), magnitude*np.exp(xs), rtol=1e-7)
+
+    def test_refine(self):
+        """
+        Refining reuses the samples: the function is only evaluated at the new points.
+        """
+        def h(x):
+            return np.exp(np.sin(3*x))*np.cos(5*x)
+        loose = Chebfun.from_function(h, tol=1e-6, keep_samples=True)
+        points = []
+        def g(x):
+            points.append(len(x))
+            return h(x)
+        refined = loose.refine(g)
+        self.assertTrue(points)
+        self.assertEqual(points[0], len(loose._samples) - 1)
+        self.assertEqual(len(loose._samples) + sum(points), len(refined._samples))
+        self.assertEqual(refined.size(), Chebfun.from_function(h).size())
+        npt.assert_allclose(refined(xs), h(xs), atol=1e-14)
+
+    def test_refine_converged(self):
+        """
+        No sample is needed for a tolerance already met.
+        """
+        c = Chebfun.from_function(f, keep_samples=True)
+        def g(x):
+            raise AssertionError("sampled")
+        self.assertLess(c.refine(g, tol=1e-8).size(), c.size())
+
+    def test_refine_domain(self):
+        domain = [0., 3.]
+        loose = Chebfun.from_function(f, domain=domain, tol=1e-6, keep_samples=True)
+        refined = loose.refine(f)
+        x = np.linspace(0, 3, 100)
+        npt.assert_allclose(refined(x), f(x), atol=1e-14)
+        npt.assert_array_equal(refined.domain(), domain)
+
+    def test_refine_values(self):
+        """
+        Without kept samples, the function is sampled again at the Chebyshev points of the chebfun.
+        """
+        c = Chebfun(f(interpolation_points(9)))
+        points = []
+        def g(x):
+            points.append(len(x))
+            return f(x)
+        refined = c.refine(g)
+        self.assertEqual(points[0], 9)
+        npt.assert_allclose(refined(xs), f(xs), atol=1e-14)
+
+    def test_refine_loose(self):
+        """
+        A loose chebfun is refined to machine precision, although its values are only as accurate as itself.
+        """
+        def h(x):
+            return np.exp(np.sin(3*x))*np.cos(5*x)
+        for g in [h, np.cos]:
+            loose = Chebfun.from_function(g, tol=1e-6)
+            refined = loose.refine(g)
+            self.assertGreater(refined.size(), loose.size())
+            npt.assert_allclose(refined(xs), g(xs), atol=1e-14)
+
 class TestDifferentiate(unittest.TestCase):
     def test_diffquad(self):
         """
@@ -282,6 +420,44 @@ class TestSimple(unittest.TestCase):
         s = p.dot(Chebfun(1.))
         self.assertAlmostEqual(s, p.sum())
 
+    def test_dot_coefficients(self):
+        """
+        The scalar product computed from the coefficients agrees with the integral of the product.
+        """
+        p = Chebfun.from_function(f, domain=[0, 2])
+        q = Chebfun.from_function(np.exp, domain=[0, 2])
+        npt.assert_allclose(p.dot(q), (p*q).sum())
+        self.assertAlmostEqual(q.norm()**2, (np.exp(4) - 1)/2)
+        self.assertAlmostEqual(p.dot(2.), 2*p.sum())
+        c = Chebfun.from_function(circle)
+        npt.assert_allclose(c.dot(Chebfun.identity()), [0, 2/np.pi], atol=1e-15)
+        with self.assertRaises(Chebfun.DomainMismatch):
+            p.dot(Chebfun.identity())
+        x = Chebfun.identity()
+        for other in [x.lazy(), PiecewiseChebfun.from_function(np.abs)]:
+            with self.assertRaises(TypeError):
+                x.dot(other)
+        three = Chebfun.from_function(lambda x: np.array([x, x**2, x**3]).T)
+        with self.assertRaises(ValueError):
+            c.dot(three)
+        npt.assert_allclose(three.dot(x), [2/3, 0, 2/5], atol=1e-15)
+
+    def test_dot_large(self):
+        """
+        Long expansions are multiplied by FFT.
+        """
+        rng = np.random.RandomState(0)
+        a = rng.randn(300)/np.arange(1, 301)
+        b = rng.randn(200)/np.arange(1, 201)
+        expected = np.dot(a, np.dot(product_weights(300)[:, :200], b))
+        npt.assert_allclose(coefficient_dot(a, b), expected, atol=1e-14)
+        npt.assert_allclose(coefficient_dot(a[:20], b[:30]), np.dot(a[:20], np.dot(product_weights(30)[:20], b[:30])), atol=1e-14)
+
+    def test_product_weights(self):
+        W = product_weights(6)
+        expected = [[(Chebfun.basis(i)*Chebfun.basis(j)).sum() for j in range(6)] for i in range(6)]
+        npt.assert_allclose(W, expected, atol=1e-15)
+
     def test_zero(self):
         """
         Chebfun for zero has the minimal degree 5
@@ -304,6 +480,30 @@ class TestSimple(unittest.TestCase):
         roots = p.roots()
         npt.assert_allclose(roots, r)
 
+    def test_roots_split(self):
+        """
+        Roots of a chebfun of high degree, computed by splitting the interval.
+        """
+        p = Chebfun.from_function(lambda x: np.sin(200*x))
+        self.assertGreater(p.size(), p.colleague_size)
+        roots = p.roots()
+        k = np.arange(-63, 64)
+        npt.assert_allclose(roots, k*np.pi/200, atol=1e-12)
+
+    def test_roots_none(self):
+        self.assertEqual(len(Chebfun.from_function(lambda x: 2+np.sin(x)).roots()), 0)
+        self.assertEqual(len(Chebfun(1.).roots()), 0)
+
+    def test_roots_zero(self):
+        zero = Chebfun([0., 0., 0.])
+        self.assertEqual(len(zero.roots()), 0)
+        self.assertEqual(len(zero.roots(complex_roots=True)), 0)
+
+    def test_complex_roots(self):
+        p = Chebfun.from_function(lambda x: x**2 + 0.01)
+        self.assertEqual(len(p.roots()), 0)
+        npt.assert_allclose(p.roots(complex_roots=True), [-.1j, .1j])
+
     def test_basis(self, n=4):
         """
         Tn(cos(t)) = cos(nt)
@@ -327,6 +527,65 @@ class TestSimple(unittest.TestCase):
         c = Chebfun.identity()
         assert_equal(c, lambda x:x)
 
+class TestExtrema(unittest.TestCase):
+    def setUp(self):
+        self.p = Chebfun.from_function(f)
+
+    def test_max_min(self):
+        fine = np.linspace(-1, 1, 100001)
+        self.assertAlmostEqual(self.p.max(), np.max(f(fine)), places=6)
+        self.assertAlmostEqual(self.p.min(), np.min(f(fine)), places=6)
+        self.assertAlmostEqual(self.p.argmax(), fine[np.argmax(f(fine))], places=4)
+        self.assertAlmostEqual(self.p.argmin(), fine[np.argmin(f(fine))], places=4)
+
+    def test_extrema(self):
+        """
+        The extrema are the endpoints and the zeros of the derivative.
+        """
+        points, values = self.p.extrema()
+        npt.assert_allclose(points[[0,-1]], [-1., 1.])
+        npt.assert_allclose(fd(points[1:-1]), 0, atol=1e-9)
+        npt.assert_allclose(values, f(points), atol=1e-13)
+
+    def test_endpoints(self):
+        x = Chebfun.identity()
+        self.assertEqual(x.argmax(), 1.)
+        self.assertEqual(x.argmin(), -1.)
+        self.assertAlmostEqual(Chebfun(2.).max(), 2.)
+
+    def test_cached_derivative(self):
+        self.p.max()
+        self.assertIs(self.p.derivative_coefficients(), self.p.derivative_coefficients())
+
+    def test_vector(self):
+        c = Chebfun.from_function(circle)
+        npt.assert_allclose(c.max(), [1., 1.])
+        npt.assert_allclose(c.min(), [-1., -1.])
+        npt.assert_allclose(c.argmax(), [0., .5], atol=1e-10)
+
+class TestDichotomy(unittest.TestCase):
+    def test_nested_samples(self):
+        """
+        Samples from the coarser levels are reused: f is evaluated once per point of the finest grid.
+        """
+        count = [0]
+        def counted(x):
+            count[0] += np.size(x)
+            return f(x)
+        coeffs = Chebfun.dichotomy(counted)
+        self.assertEqual(count[0], len(coeffs))
+
+    def test_sample_refine(self):
+        """
+        Refined samples agree with direct sampling.
+        """
+        coarse = sample_function(f, 8)
+        npt.assert_allclose(sample_function(f, 16, coarse), sample_function(f, 16))
+
+    def test_sample_refine_vector(self):
+        coarse = sample_function(circle, 4)
+        npt.assert_allclose(sample_function(circle, 8, coarse), sample_function(circle, 8))
+
 class TestPolyfitShape(unittest.TestCase):
     def test_scalar(self):
         for datalen in [1,3]:
@@ -345,6 +604,394 @@ class TestPolyfitShape(unittest.TestCase):
         expected = chebpolyfit(adata)
         npt.assert_array_almost_equal(result, expected)
 
+class TestTransforms(unittest.TestCase):
+    """
+    The DCT-I and the dense matrices agree with the FFT of the even extension.
+    """
+    sizes = [2, 5, 33, 65, 66, 129, 1000]
+
+    def test_fit(self):
+        for N in self.sizes:
+            data = np.random.randn(N, 2) + 1j*np.random.randn(N, 2)
+            npt.assert_allclose(chebpolyfit(data), dct(even_data(data)), atol=1e-14)
+            npt.assert_allclose(chebpolyfit(data.real), dct(even_data(data.real)), atol=1e-14)
+
+    def test_roundtrip(self):
+        for N in self.sizes:
+            data = np.random.randn(N)
+            npt.assert_allclose(chebpolyval(chebpolyfit(data)), data)
+            self.assertTrue(np.isrealobj(chebpolyval(data)))
+
+    def test_higher_dimension(self):
+        data = np.random.randn(9, 2, 3)
+        npt.assert_allclose(chebpolyfit(data)[:,1,2], chebpolyfit(data[:,1,2]))
+
+    def test_workers(self):
+        """
+        The columns of vector valued data are transformed in parallel threads.
+        """
+        for shape in [(200,), (200, 5), (200, 2, 3)]:
+            data = np.random.randn(*shape) + 1j*np.random.randn(*shape)
+            for workers in [2, 3, 20]:
+                npt.assert_array_equal(chebpolyfit(data, workers=workers), chebpolyfit(data))
+                npt.assert_array_equal(chebpolyval(data, workers=workers), chebpolyval(data))
+
+class TestSizeCache(unittest.TestCase):
+    def test_shared(self):
+        """
+        Chebfuns of the same size share their points and weights.
+        """
+        c1 = Chebfun(np.random.randn(10))
+        c2 = Chebfun(np.random.randn(10))
+        self.assertIs(c1.p.xi, c2.p.xi)
+        self.assertIs(c1.p.wi, c2.p.wi)
+        self.assertFalse(c1.p.xi.flags.writeable)
+
+    def test_hits(self):
+        info = size_cache.info()
+        interpolation_points(11)
+        interpolation_points(11)
+        new = size_cache.info()
+        self.assertGreaterEqual(new.hits, info.hits + 1)
+
+    def test_bounded(self):
+        cache = SizeCache(maxsize=2)
+        for N in [3, 4, 3, 5]:
+            cache.get(N, lambda: np.zeros(N))
+        self.assertEqual(cache.info(), CacheInfo(hits=1, misses=3, maxsize=2, currsize=2))
+        cache.get(4, lambda: np.zeros(4))
+        self.assertEqual(cache.info().misses, 4)
+        cache.clear()
+        self.assertEqual(cache.info(), CacheInfo(0, 0, 2, 0))
+
+    def test_bytes(self):
+        """
+        The cache is also bounded by the bytes it holds.
+        """
+        cache = SizeCache(maxbytes=1200)
+        for N in [50, 60, 70]:
+            cache.get(N, lambda: np.zeros(N))
+        self.assertEqual(cache.info().currsize, 2)
+        self.assertEqual(cache.nbytes, 8*(60 + 70))
+        cache.get(200, lambda: np.zeros(200))
+        self.assertEqual(cache.info().currsize, 0)
+        self.assertEqual(cache.nbytes, 0)
+        D = differentiation_matrix(100)
+        self.assertEqual(cached_nbytes(D), D.data.nbytes + D.indices.nbytes + D.indptr.nbytes)
+
+    def test_quadrature(self):
+        for N in [1, 2, 7, 8]:
+            expected = [2/(1-n**2) if n % 2 == 0 else 0 for n in range(N)]
+            npt.assert_allclose(quadrature_weights(N), expected)
+
+class TestEvaluation(unittest.TestCase):
+    """
+    Evaluation by blocks in a bounded amount of memory.
+    """
+    def setUp(self):
+        self.p = Chebfun.from_function(f)
+        self.memory = (Chebfun.barycentric_bytes*self.p.size() + 8)*7 # blocks of 7 points
+
+    def test_blocks(self):
+        self.assertEqual(self.p.block_size(self.memory), 7)
+        npt.assert_allclose(self.p(xs, memory=self.memory), self.p(xs))
+
+    def test_shape(self):
+        x = xs.reshape(10, 100)
+        npt.assert_allclose(self.p(x, memory=self.memory), self.p(xs).reshape(10, 100))
+        c = Chebfun.from_function(circle)
+        npt.assert_allclose(c(x, memory=self.memory), c(xs).reshape(10, 100, 2))
+
+    def test_out(self):
+        out = np.zeros_like(xs)
+        result = self.p(xs, out=out, memory=self.memory)
+        self.assertIs(result, out)
+        npt.assert_allclose(out, f(xs), atol=1e-13)
+        with self.assertRaises(ValueError):
+            self.p(xs, out=np.zeros(3))
+
+    def test_memmap(self):
+        import tempfile
+        with tempfile.NamedTemporaryFile() as tmp:
+            x = np.memmap(tmp.name, dtype=float, mode='w+', shape=xs.shape)
+            x[:] = xs
+            blocks = list(self.p.evaluate_blocks(x, memory=self.memory))
+        self.assertEqual(len(blocks[0]), 7)
+        npt.assert_allclose(np.concatenate(blocks), self.p(xs))
+
+    def test_iterator(self):
+        blocks = self.p.evaluate_blocks(iter(np.split(xs, 4)))
+        npt.assert_allclose(np.concatenate(list(blocks)), self.p(xs))
+
+    def test_algorithms(self):
+        for c in [self.p, Chebfun.from_function(circle), Chebfun.from_function(lambda x: np.exp(1j*x))]:
+            for x in [.3, xs, xs.reshape(10, 100)]:
+                npt.assert_allclose(c(x, algorithm='clenshaw'), c(x, algorithm='barycentric'), atol=1e-13)
+        with self.assertRaises(ValueError):
+            self.p(xs, algorithm='horner')
+
+    def test_clenshaw(self):
+        coeffs = np.random.randn(20, 2)
+        npt.assert_allclose(clenshaw(coeffs, xs), np.polynomial.chebyshev.chebval(xs, coeffs).T)
+        npt.assert_allclose(clenshaw([2.], xs), 2.)
+
+    def test_choice(self):
+        """
+        Barycentric for a few points, Clenshaw for many.
+        """
+        c = Chebfun.from_chebcoeff(np.random.randn(1000))
+        self.assertEqual(c.evaluation_algorithm(1), 'barycentric')
+        self.assertEqual(c.evaluation_algorithm(10000), 'clenshaw')
+
+    def test_workers(self):
+        """
+        Parallel evaluation is identical to serial evaluation.
+        """
+        self.p.grain = 64
+        for algorithm in Chebfun.algorithms:
+            serial = self.p(xs, algorithm=algorithm)
+            for workers in [2, 3, 20]:
+                parallel = self.p(xs, algorithm=algorithm, workers=workers)
+                npt.assert_array_equal(parallel, serial)
+
+    def test_worker_error(self):
+        """
+        An error in a worker thread is raised in the calling thread.
+        """
+        c = Chebfun.from_function(f)
+        c.grain = 64
+        def evaluate(t, algorithm):
+            raise ArithmeticError()
+        c._evaluate = evaluate
+        with self.assertRaises(ArithmeticError):
+            c(xs, workers=2)
+        # the traceback reaches the function which failed in the worker thread
+        try:
+            c(xs, workers=2)
+        except ArithmeticError:
+            frames = traceback.extract_tb(sys.exc_info()[2])
+        self.assertEqual(frames[-1][2], 'evaluate')
+
+def evaluate_at_half(c):
+    return c(.5)
+
+class TestFootprint(unittest.TestCase):
+    def test_lazy_values(self):
+        """
+        A chebfun constructed from coefficients computes its values only when needed.
+        """
+        c = Chebfun.from_chebcoeff(np.arange(1., 10.))
+        c.sum()
+        c.chebyshev_coefficients()
+        footprint = c.footprint()
+        self.assertEqual(footprint['values'], 0)
+        self.assertEqual(footprint['interpolator'], 0)
+        self.assertEqual(footprint['coefficients'], 9*8)
+        npt.assert_allclose(c(xs, algorithm='barycentric'), c(xs, algorithm='clenshaw'))
+        self.assertEqual(c.footprint()['values'], 9*8)
+        self.assertGreater(c.footprint()['interpolator'], 0)
+        self.assertEqual(c.nbytes(), sum(c.footprint().values()))
+
+    def test_slots(self):
+        """
+        The attributes are slots; the settings may still be overridden on an instance.
+        """
+        self.assertIn('_coeffs', Chebfun.__slots__)
+        c = Chebfun.from_function(f)
+        c.grain = 64
+        self.assertEqual(c.grain, 64)
+        self.assertNotEqual(Chebfun.grain, 64)
+
+    def test_weakref(self):
+        c = Chebfun(1.)
+        self.assertIs(weakref.ref(c)(), c)
+
+    def test_read_only(self):
+        """
+        The arrays computed by a chebfun are read-only; the default domain is shared.
+        """
+        c = Chebfun.from_function(f)
+        for array in [c.chebyshev_coefficients(), c.values(), c.derivative_coefficients(), c.domain()]:
+            self.assertFalse(array.flags.writeable)
+        self.assertIs(Chebfun.identity().domain(), c.domain())
+        self.assertEqual(c.footprint()['domain'], 0)
+        self.assertGreater(Chebfun.identity(domain=[0, 1]).footprint()['domain'], 0)
+        copy = Chebfun.from_chebfun(Chebfun.from_chebcoeff([1., 2.]))
+        self.assertEqual(copy.footprint()['values'], 0)
+
+    def test_caller_arrays(self):
+        """
+        The arrays given by the caller are not made read-only.
+        """
+        a = np.array([3.])
+        Chebfun(a).sum()
+        self.assertTrue(a.flags.writeable)
+        values = np.exp(interpolation_points(17))
+        Chebfun(values).refine(lambda x: values, tol=1e-8, chop='threshold', keep_samples=True)
+        self.assertTrue(values.flags.writeable)
+        data = np.ones(5)
+        Chebfun.from_function(lambda x: data, keep_samples=True)
+        self.assertTrue(data.flags.writeable)
+
+    def test_samples(self):
+        """
+        The samples are only kept on request.
+        """
+        c = Chebfun.from_function(f)
+        self.assertEqual(c.footprint()['samples'], 0)
+        npt.assert_allclose(c.refine(f)(xs), f(xs), atol=1e-13)
+        c = Chebfun.from_function(f, keep_samples=True)
+        self.assertGreater(c.footprint()['samples'], 0)
+        self.assertGreater(c.refine(f).footprint()['samples'], 0)
+
+class TestPickle(unittest.TestCase):
+    def setUp(self):
+        self.p = Chebfun.from_function(f, domain=[0, 2])
+
+    def test_reduce(self):
+        """
+        Only the values, the scale and the domain are pickled.
+        """
+        import pickle
+        self.p(xs+1) # builds the interpolator
+        data = pickle.dumps(self.p, pickle.HIGHEST_PROTOCOL)
+        self.assertLess(len(data), self.p._values.nbytes + 500)
+        new = pickle.loads(data)
+        self.assertIsNone(new._p)
+        npt.assert_array_equal(new(xs+1, algorithm='barycentric'), self.p(xs+1, algorithm='barycentric'))
+        npt.assert_allclose(new(xs+1), self.p(xs+1), atol=1e-13)
+        npt.assert_array_equal(new.domain(), self.p.domain())
+        self.assertEqual(new._scale, self.p._scale)
+
+    def test_reduce_coefficients(self):
+        """
+        A chebfun whose values are not computed is pickled as its coefficients.
+        """
+        import pickle
+        c = Chebfun.from_function(f)
+        nbytes = c.nbytes()
+        data = pickle.dumps(c, pickle.HIGHEST_PROTOCOL)
+        self.assertEqual(c.nbytes(), nbytes)
+        self.assertLess(len(data), c.chebyshev_coefficients().nbytes + 500)
+        new = pickle.loads(data)
+        self.assertEqual(new.footprint()['values'], 0)
+        npt.assert_array_equal(new.chebyshev_coefficients(), c.chebyshev_coefficients())
+        npt.assert_array_equal(new(xs), c(xs))
+
+    def test_shared(self):
+        import pickle
+        shared = self.p.share()
+        try:
+            new = pickle.loads(pickle.dumps(shared))
+            self.assertFalse(new._values.flags.writeable)
+            self.assertEqual(new._shared, shared._shared)
+            npt.assert_array_equal(new.chebyshev_coefficients(), self.p.chebyshev_coefficients())
+            npt.assert_array_equal(new(xs+1), self.p(xs+1))
+        finally:
+            shared.unlink()
+        self.assertFalse(os.path.exists(shared._shared))
+        npt.assert_array_equal(new(xs+1), self.p(xs+1))
+
+    def test_shared_integers(self):
+        """
+        The coefficients of integer values are shared as floats.
+        """
+        c = Chebfun(np.array([1, 2, 4]))
+        shared = c.share()
+        try:
+            npt.assert_allclose(shared.chebyshev_coefficients(), [2.25, -1.5, .25])
+            npt.assert_allclose(shared(.5, algorithm='clenshaw'), 1.375)
+            npt.assert_allclose(shared(xs), c(xs))
+        finally:
+            shared.unlink()
+
+    def test_multiprocessing(self):
+        import multiprocessing
+        pool = multiprocessing.Pool(2)
+        shared = self.p.share()
+        try:
+            results = pool.map(evaluate_at_half, [self.p, shared])
+        finally:
+            pool.close()
+            pool.join()
+            shared.unlink()
+        npt.assert_allclose(results, self.p(.5))
+
+import math
+
+def scalar_f(x):
+    """
+    f, for a scalar x only.
+    """
+    return math.sin(6*x) + math.sin(30*math.exp(x))
+
+def scalar_abs(x):
+    if x < 0:
+        return -x
+    return x
+
+class TestSampling(unittest.TestCase):
+    def test_vectorized(self):
+        self.assertTrue(is_vectorized(f, xs[:2]))
+        self.assertFalse(is_vectorized(scalar_f, xs[:2]))
+        self.assertFalse(is_vectorized(scalar_abs, xs[:2]))
+
+    def test_threads(self):
+        expected = Chebfun.from_function(f)
+        for g in [f, scalar_f]:
+            c = Chebfun.from_function(g, workers=3)
+            npt.assert_allclose(c.chebyshev_coefficients(), expected.chebyshev_coefficients(), atol=1e-15)
+
+    def test_domain(self):
+        c = Chebfun.from_function(scalar_abs, N=4, domain=[1, 2], workers=2)
+        npt.assert_allclose(c((xs+3)/2), (xs+3)/2)
+
+    def test_vector(self):
+        c = Chebfun.from_function(lambda x: np.array([math.cos(x), math.sin(x)]), workers=2)
+        npt.assert_allclose(c(xs), np.array([np.cos(xs), np.sin(xs)]).T, atol=1e-14)
+
+    def test_processes(self):
+        import multiprocessing
+        pool = multiprocessing.Pool(2)
+        try:
+            c = Chebfun.from_function(scalar_f, executor=pool)
+        finally:
+            pool.close()
+            pool.join()
+        assert_equal(c, f, atol=1e-13)
+
+    def test_error(self):
+        """
+        The point where the function fails is reported.
+        """
+        def g(x):
+            if abs(x) < 1e-10:
+                raise ZeroDivisionError()
+            return x
+        with self.assertRaises(SamplingError) as context:
+            Chebfun.from_function(g, N=8, workers=2)
+        points, error = context.exception.args
+        npt.assert_allclose(points, [0.], atol=1e-15)
+        self.assertIsInstance(error, ZeroDivisionError)
+
+    def test_timeout(self):
+        """
+        Sampling fails as soon as a point takes longer than the timeout, without waiting for the running calls.
+        """
+        import time
+        def slow(x):
+            time.sleep(3)
+            return x
+        def slow_scalar(x):
+            y = math.sin(x)
+            time.sleep(3)
+            return y
+        for g in [slow, slow_scalar]:
+            start = time.time()
+            with self.assertRaises(Chebfun.SamplingError):
+                Chebfun.from_function(g, N=8, workers=2, timeout=.01)
+            self.assertLess(time.time() - start, 1.)
+
 class TestEven(unittest.TestCase):
     def test_scalar(self):
         data = np.arange(5) # [0, 1, 2, 3, 4]
@@ -366,6 +1013,43 @@ class TestDifferentiator(unittest.TestCase):
         d = differentiator(np.array([1.]))
         self.assertEqual(np.shape(d), np.shape(np.array([0.])))
 
+    def test_chebder(self):
+        coeffs = np.random.randn(31, 3)
+        for n in [1, 2, 5]:
+            npt.assert_allclose(chebdiff(coeffs, n), np.polynomial.chebyshev.chebder(coeffs, n), atol=1e-10)
+        npt.assert_allclose(differentiator(coeffs)[:-1], np.polynomial.chebyshev.chebder(coeffs))
+
+    def test_short(self):
+        for n in [1, 3]:
+            npt.assert_array_equal(chebdiff([2.], n), [0.])
+        npt.assert_array_equal(chebdiff([2., 3.], 3), [0.])
+
+    def test_matrix(self):
+        coeffs = np.random.randn(20, 2)
+        for n in [1, 2]:
+            D = differentiation_matrix(20, n)
+            self.assertEqual(D.shape, (20-n, 20))
+            npt.assert_allclose(D.dot(coeffs), chebdiff(coeffs, n), atol=1e-11)
+            self.assertIs(differentiation_matrix(20, n), D)
+        self.assertEqual(differentiation_matrix(20).nnz, 100)
+        npt.assert_array_equal(differentiation_matrix(1, 2).toarray(), [[0.]])
+
+    def test_matrix_large(self):
+        """
+        The large matrices are not cached.
+        """
+        N = differentiation_cache_size + 1
+        rng = np.random.RandomState(0)
+        coeffs = rng.randn(N)
+        D = differentiation_matrix(N)
+        expected = chebdiff(coeffs)
+        npt.assert_allclose(D.dot(coeffs), expected, rtol=1e-12, atol=1e-12*np.max(np.abs(expected)))
+        self.assertIsNot(differentiation_matrix(N), D)
+
+    def test_coefficients(self):
+        c = Chebfun.from_function(np.exp, domain=[0, 2])
+        npt.assert_allclose(c.derivative_coefficients(2), c.chebyshev_coefficients()[:-2], atol=1e-10)
+
 class TestInitialise(unittest.TestCase):
     def test_intlist(self):
         """
@@ -460,6 +1144,21 @@ class Test_Misc(unittest.TestCase):
             c = Chebfun.basis(n)
             npt.assert_array_almost_equal(c.chebyshev_coefficients(), np.array([0]*n+[1.]))
 
+    def test_cached_coefficients(self):
+        """
+        The Chebyshev coefficients are computed only once.
+        """
+        c = Chebfun.from_function(f)
+        self.assertIs(c.chebyshev_coefficients(), c.chebyshev_coefficients())
+
+    def test_chebcoeff_kept(self):
+        """
+        Coefficients given to from_chebcoeff are kept as they are.
+        """
+        coeffs = np.random.randn(10)
+        c = Chebfun.from_chebcoeff(coeffs, prune=False)
+        npt.assert_array_equal(c.chebyshev_coefficients(), coeffs)
+
     def test_list_init(self):
         c = Chebfun([1.])
         npt.assert_array_almost_equal(c.chebyshev_coefficients(),np.array([1.]))
@@ -545,6 +1244,29 @@ class Test_Arithmetic(unittest.TestCase):
         npt.assert_allclose(z(xs), np.zeros_like(xs), rtol=1e-7, atol=1e-8)
         self.assertEqual(z.size(), 1)
 
+    def test_mul_polynomial(self):
+        """
+        The product of T_3 and T_4 is (T_1 + T_7)/2, with no superfluous coefficients.
+        """
+        p = Chebfun.basis(3) * Chebfun.basis(4)
+        expected = np.zeros(8)
+        expected[[1,7]] = .5
+        npt.assert_allclose(p.chebyshev_coefficients(), expected, atol=1e-14)
+
+    def test_mul(self):
+        p = self.p1 * self.p2
+        assert_equal(p, lambda x: f(x)*runge(x), atol=1e-13)
+
+    def test_mul_scale(self):
+        """
+        The product is pruned relative to its own size.
+        """
+        for scale in [1e-8, 1e8]:
+            p = Chebfun.from_function(lambda x: scale*np.sin(3*x))
+            q = p*p
+            npt.assert_allclose(q(xs), (scale*np.sin(3*xs))**2, rtol=0, atol=1e-14*scale**2)
+            self.assertLessEqual(q.size(), Chebfun.from_function(lambda x: (scale*np.sin(3*x))**2).size() + 1)
+
     def test_add_mistype(self):
         """
         Possible to add a Chebfun and a function 
@@ -555,6 +1277,116 @@ class Test_Arithmetic(unittest.TestCase):
         c = Chebfun.from_function(f)
         c + f
 
+class TestDomain(unittest.TestCase):
+    def setUp(self):
+        self.domain = [0., 2.]
+        self.p = Chebfun.from_function(np.exp, domain=self.domain)
+        self.ys = np.linspace(0, 2, 1000)
+
+    def test_eval(self):
+        npt.assert_allclose(self.p(self.ys), np.exp(self.ys))
+        npt.assert_allclose(self.p.points()[[0,-1]], [2., 0.])
+
+    def test_chebfun(self):
+        c = chebfun(np.exp, domain=self.domain)
+        npt.assert_allclose(c.domain(), self.domain)
+        npt.assert_allclose(c(self.ys), np.exp(self.ys))
+
+    def test_sum(self):
+        npt.assert_allclose(self.p.sum(), np.exp(2) - 1)
+
+    def test_differentiate(self):
+        d = Chebfun.from_function(np.sin, domain=self.domain).differentiate(2)
+        npt.assert_allclose(d(self.ys), -np.sin(self.ys), atol=1e-9)
+
+    def test_integrate(self):
+        """
+        The primitive vanishes at the centre of the domain.
+        """
+        q = self.p.integrate()
+        npt.assert_allclose(q(self.ys), np.exp(self.ys) - np.exp(1), atol=1e-13)
+
+    def test_roots(self):
+        s = Chebfun.from_function(np.sin, domain=[2, 8])
+        npt.assert_allclose(s.roots(), [np.pi, 2*np.pi])
+
+    def test_extrema(self):
+        s = Chebfun.from_function(np.sin, domain=[2, 8])
+        npt.assert_allclose(s.argmax(), 5*np.pi/2)
+        npt.assert_allclose(s.argmin(), 3*np.pi/2)
+
+    def test_identity(self):
+        x = Chebfun.identity(domain=self.domain)
+        npt.assert_allclose(x(self.ys), self.ys)
+
+    def test_arithmetic(self):
+        x = Chebfun.identity(domain=self.domain)
+        q = (self.p*x + 1)/(1 + x) - np.sin(x)
+        npt.assert_allclose(q.domain(), self.domain)
+        npt.assert_allclose(q(self.ys), (np.exp(self.ys)*self.ys + 1)/(1 + self.ys) - np.sin(self.ys), atol=1e-13)
+
+    def test_restrict(self):
+        r = self.p.restrict([.5, 1.])
+        npt.assert_allclose(r.domain(), [.5, 1.])
+        zs = np.linspace(.5, 1.)
+        npt.assert_allclose(r(zs), np.exp(zs))
+
+    def test_mismatch(self):
+        """
+        Combining chebfuns on different domains is an error.
+        """
+        q = Chebfun.from_function(np.exp)
+        for op in [operator.add, operator.sub, operator.mul, operator.truediv, operator.pow]:
+            with self.assertRaises(Chebfun.DomainMismatch):
+                op(self.p, q)
+        with self.assertRaises(Chebfun.DomainMismatch):
+            (self.p.lazy() + q).chebfun()
+        self.assertNotEqual(self.p, q)
+
+    def test_lazy(self):
+        e = np.sin(self.p.lazy()) + 1
+        npt.assert_allclose(e.chebfun()(self.ys), np.sin(np.exp(self.ys)) + 1)
+
+class TestLazy(unittest.TestCase):
+    def setUp(self):
+        x = Chebfun.identity()
+        self.f = np.sin(x)
+        self.g = 2 + np.cos(x)
+        self.h = 3 + x
+
+    def test_fused(self):
+        """
+        A lazy expression is built once and agrees with the eager one.
+        """
+        f, g, h = self.f, self.g, self.h
+        e = (f.lazy().exp().sin() * g) / h
+        self.assertEqual(e.avoided(), 3)
+        result = e.chebfun()
+        self.assertIsInstance(result, Chebfun)
+        assert_equal(result, (f.exp().sin() * g) / h)
+
+    def test_mixed(self):
+        """
+        Chebfuns and scalars may appear on either side of a lazy expression.
+        """
+        f, g = self.f, self.g
+        e = 1 - g * np.exp(f.lazy()) / 2
+        self.assertIsInstance(e, LazyChebfun)
+        assert_equal(e.chebfun(), lambda x: 1 - g(x)*np.exp(f(x))/2)
+
+    def test_neg_pow(self):
+        e = -self.h.lazy()**2
+        assert_equal(e.chebfun(), -self.h**2)
+
+    def test_rpow(self):
+        f, h = self.f, self.h
+        e = 2**f.lazy()
+        self.assertIsInstance(e, LazyChebfun)
+        assert_equal(e.chebfun(), lambda x: 2**f(x))
+        e = h**f.lazy()
+        self.assertIsInstance(e, LazyChebfun)
+        assert_equal(e.chebfun(), lambda x: h(x)**f(x))
+
 class TestVector(unittest.TestCase):
     """
     Tests for the vector chebfuns.
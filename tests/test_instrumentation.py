@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# coding: UTF-8
+from __future__ import division
+
+import os
+
+import sys
+testdir = os.path.dirname(__file__)
+moduledir = os.path.join(testdir, os.path.pardir)
+sys.path.insert(0, moduledir)
+from pychebfun import *
+
+import numpy as np
+np.seterr(all='raise')
+
+import unittest
+
+from tools import *
+
+xs = np.linspace(-1, 1, 1000)
+
+class TestInstrumentation(unittest.TestCase):
+    def test_construction(self):
+        calls = []
+        def g(x):
+            calls.append(len(x))
+            return f(x)
+        with instrumentation() as counters:
+            c = Chebfun.from_function(g)
+        self.assertEqual(counters.counts['sample'], len(calls))
+        self.assertEqual(counters.sizes['sample'], sum(calls))
+        self.assertEqual(counters.counts['dichotomy_level'], len(calls))
+        self.assertEqual(counters.last['dichotomy_level'], sum(calls))
+        self.assertEqual(counters.last['dichotomy'], c.size())
+        self.assertGreaterEqual(counters.counts['chebpolyfit'], len(calls))
+        self.assertNotIn('no_convergence', counters.counts)
+        self.assertGreater(counters.times['sample'], 0)
+
+    def test_no_convergence(self):
+        with instrumentation() as counters:
+            with self.assertRaises(Chebfun.NoConvergence):
+                Chebfun.from_function(np.sign)
+        self.assertEqual(counters.counts['no_convergence'], 1)
+
+    def test_evaluation(self):
+        c = Chebfun.from_function(f)
+        with instrumentation() as counters:
+            c(xs, algorithm='clenshaw')
+            c(.5, algorithm='barycentric')
+        self.assertEqual(counters.sizes['evaluate.clenshaw'], len(xs))
+        self.assertEqual(counters.sizes['evaluate.barycentric'], 1)
+        self.assertIn('evaluate.clenshaw', counters.report())
+
+    def test_callback(self):
+        events = []
+        def callback(event, size, duration):
+            events.append(event)
+        with instrumentation(callback) as counters:
+            Chebfun.from_function(np.exp)
+        self.assertEqual(len(events), sum(counters.counts.values()))
+        # disabled outside the block
+        Chebfun.from_function(np.exp)
+        self.assertEqual(len(events), sum(counters.counts.values()))
+
+    def test_cumulative(self):
+        counters = Counters()
+        add_recorder(counters)
+        try:
+            Chebfun.from_function(np.exp)
+            Chebfun.from_function(np.exp)
+        finally:
+            remove_recorder(counters)
+        self.assertEqual(counters.counts['dichotomy'], 2)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# coding: UTF-8
+from __future__ import division
+
+import os
+
+import sys
+testdir = os.path.dirname(__file__)
+moduledir = os.path.join(testdir, os.path.pardir)
+sys.path.insert(0, moduledir)
+from pychebfun import *
+
+import numpy as np
+np.seterr(all='raise')
+import numpy.testing as npt
+
+import unittest
+import tempfile
+import shutil
+
+from tools import *
+
+xs = np.linspace(-1, 1, 1000)
+
+class TestChebfunLibrary(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'library')
+        self.chebfuns = {
+            'f': Chebfun.from_function(f),
+            'exp': Chebfun.from_function(np.exp, domain=[0, 2]),
+            'circle': Chebfun.from_function(circle),
+            }
+        library = ChebfunLibrary(self.path, 'w')
+        library.update(sorted(self.chebfuns.items()))
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.path))
+
+    def test_load(self):
+        library = ChebfunLibrary(self.path)
+        self.assertEqual(len(library), 3)
+        self.assertEqual(library.keys(), ['circle', 'exp', 'f'])
+        for key, c in self.chebfuns.items():
+            loaded = library[key]
+            npt.assert_array_equal(loaded.chebyshev_coefficients(), c.chebyshev_coefficients())
+            npt.assert_array_equal(loaded.domain(), c.domain())
+            x = c.domain()[0] + (xs + 1)*(c.domain()[1] - c.domain()[0])/2
+            npt.assert_allclose(loaded(x), c(x), atol=1e-14)
+
+    def test_memmap(self):
+        """
+        The coefficients are a read-only view of the mapped file.
+        """
+        library = ChebfunLibrary(self.path)
+        coeffs = library.coefficients('f')
+        self.assertTrue(np.may_share_memory(coeffs, library._memmap()))
+        self.assertFalse(coeffs.flags.writeable)
+
+    def test_footprint(self):
+        """
+        A loaded chebfun holds no copy of its coefficients, and computes its values only when evaluated.
+        """
+        loaded = ChebfunLibrary(self.path)['f']
+        self.assertEqual(loaded.footprint()['coefficients'], 0)
+        self.assertEqual(loaded.footprint()['values'], 0)
+        loaded(xs, algorithm='barycentric')
+        self.assertEqual(loaded.footprint()['values'], loaded.values().nbytes)
+
+    def test_append(self):
+        library = ChebfunLibrary(self.path, 'a')
+        library['identity'] = Chebfun.identity()
+        npt.assert_allclose(library['identity'](xs), xs)
+        npt.assert_allclose(library['f'](xs), f(xs), atol=1e-13)
+        reopened = ChebfunLibrary(self.path)
+        self.assertEqual(reopened.keys(), ['circle', 'exp', 'f', 'identity'])
+        npt.assert_allclose(reopened['identity'](xs), xs)
+        with self.assertRaises(KeyError):
+            library.append('f', Chebfun.identity())
+
+    def test_many(self):
+        """
+        The keys are found through the hash table as it grows.
+        """
+        library = ChebfunLibrary(self.path, 'a')
+        for i in range(100):
+            library[str(i)] = Chebfun.identity()
+        reopened = ChebfunLibrary(self.path)
+        self.assertEqual(len(reopened), 103)
+        self.assertEqual(len(reopened._buckets), 256)
+        for i in range(100):
+            self.assertIn(str(i), reopened)
+        self.assertNotIn('100', reopened)
+        npt.assert_allclose(reopened['99'](xs), xs)
+        npt.assert_allclose(reopened['f'](xs), f(xs), atol=1e-13)
+
+    def test_read_only(self):
+        library = ChebfunLibrary(self.path)
+        with self.assertRaises(IOError):
+            library['identity'] = Chebfun.identity()
+
+    def test_dtype(self):
+        library = ChebfunLibrary(self.path, 'a')
+        with self.assertRaises(TypeError):
+            library['complex'] = Chebfun.from_function(lambda x: np.exp(1j*x))
+        complex_library = ChebfunLibrary(os.path.join(self.path, 'complex'), 'w', dtype=complex)
+        c = Chebfun.from_function(lambda x: np.exp(1j*x))
+        complex_library['complex'] = c
+        npt.assert_allclose(complex_library['complex'](xs), c(xs))
+
+    def test_empty(self):
+        library = ChebfunLibrary(os.path.join(self.path, 'empty'), 'a')
+        self.assertEqual(len(library), 0)
+        self.assertNotIn('f', library)
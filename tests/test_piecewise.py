@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# coding: UTF-8
+from __future__ import division
+
+import os
+
+import sys
+testdir = os.path.dirname(__file__)
+moduledir = os.path.join(testdir, os.path.pardir)
+sys.path.insert(0, moduledir)
+from pychebfun import *
+
+import numpy as np
+np.seterr(all='raise')
+import numpy.testing as npt
+
+import unittest
+
+from tools import *
+
+xs = np.linspace(-1, 1, 1000)
+
+def kink(x):
+    return np.abs(x - .3)
+
+class TestPiecewise(unittest.TestCase):
+    def test_abs(self):
+        """
+        abs is split at zero, with very few points.
+        """
+        p = PiecewiseChebfun.from_function(np.abs)
+        self.assertLess(p.size(), 10)
+        npt.assert_allclose(p(xs), np.abs(xs), atol=1e-15)
+        npt.assert_allclose(p.sum(), 1.)
+
+    def test_scale(self):
+        """
+        The pieces are pruned relative to the size of the function.
+        """
+        for scale in [1e-20, 1e20]:
+            p = PiecewiseChebfun.from_function(lambda x: scale*np.abs(x))
+            self.assertLess(p.size(), 10)
+            npt.assert_allclose(p(xs), scale*np.abs(xs), rtol=1e-14, atol=1e-15*scale)
+
+    def test_kink(self):
+        p = PiecewiseChebfun.from_function(kink)
+        self.assertLess(p.size(), 10)
+        npt.assert_allclose(p(xs), kink(xs), atol=1e-14)
+        npt.assert_allclose(p.sum(), (1.3**2 + .7**2)/2)
+
+    def test_jump(self):
+        def step(x):
+            return np.exp(x)*(x > .5)
+        p = PiecewiseChebfun.from_function(step)
+        self.assertLess(p.size(), 40)
+        npt.assert_allclose(p(xs), step(xs), atol=1e-13)
+        npt.assert_allclose(p.sum(), np.exp(1) - np.exp(.5))
+
+    def test_smooth(self):
+        """
+        A smooth function gives a single piece.
+        """
+        p = PiecewiseChebfun.from_function(np.exp)
+        self.assertEqual(len(p.pieces), 1)
+
+    def test_breakpoints(self):
+        p = PiecewiseChebfun.from_function(f, breakpoints=[-1, 0, .5, 1], splitting=False)
+        npt.assert_allclose(p.breakpoints(), [-1, 0, .5, 1])
+        npt.assert_allclose(p(xs), f(xs), atol=1e-13)
+        npt.assert_allclose(p.sum(), Chebfun.from_function(f).sum())
+
+    def test_roots(self):
+        p = PiecewiseChebfun.from_function(np.abs) - .5
+        npt.assert_allclose(p.roots(), [-.5, .5])
+
+    def test_roots_breakpoint(self):
+        """
+        A root on a breakpoint is only reported once.
+        """
+        p = PiecewiseChebfun.from_function(kink) * Chebfun.identity()
+        npt.assert_allclose(p.roots(), [0., .3], atol=1e-14)
+
+    def test_arithmetic(self):
+        a = PiecewiseChebfun.from_function(np.abs)
+        b = PiecewiseChebfun.from_function(kink)
+        npt.assert_allclose((a + b)(xs), np.abs(xs) + kink(xs), atol=1e-14)
+        npt.assert_allclose((a - 2*b)(xs), np.abs(xs) - 2*kink(xs), atol=1e-14)
+        npt.assert_allclose((a * b)(xs), np.abs(xs)*kink(xs), atol=1e-14)
+        npt.assert_allclose((a / (1 + b))(xs), np.abs(xs)/(1 + kink(xs)), atol=1e-14)
+        npt.assert_allclose((-a)(xs), -np.abs(xs))
+        npt.assert_allclose((2 / (1 + a))(xs), 2/(1 + np.abs(xs)), atol=1e-14)
+        npt.assert_allclose((1 - a)(xs), 1 - np.abs(xs), atol=1e-14)
+        self.assertEqual(len((a + b).pieces), len(a.pieces) + len(b.pieces) - 1)
+
+    def test_chebfun(self):
+        a = PiecewiseChebfun.from_function(np.abs)
+        c = Chebfun.from_function(np.cos)
+        npt.assert_allclose((a * c)(xs), np.abs(xs)*np.cos(xs), atol=1e-14)
+        npt.assert_allclose((c + a)(xs), np.cos(xs) + np.abs(xs), atol=1e-14)
+        npt.assert_allclose((c - a)(xs), np.cos(xs) - np.abs(xs), atol=1e-14)
+        npt.assert_allclose((c * a)(xs), np.cos(xs)*np.abs(xs), atol=1e-14)
+        npt.assert_allclose((c / (1 + a))(xs), np.cos(xs)/(1 + np.abs(xs)), atol=1e-14)
+
+    def test_domain(self):
+        p = PiecewiseChebfun.from_function(lambda x: np.abs(x - 1), breakpoints=[0, 3])
+        ys = np.linspace(0, 3, 100)
+        npt.assert_allclose(p(ys), np.abs(ys - 1), atol=1e-14)
+        npt.assert_allclose(p.sum(), 2.5)
+        npt.assert_allclose((p + Chebfun.identity([0, 3]))(ys), np.abs(ys - 1) + ys, atol=1e-14)
+        with self.assertRaises(Chebfun.DomainMismatch):
+            p + PiecewiseChebfun.from_function(np.abs)